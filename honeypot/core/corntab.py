@@ -1,11 +1,78 @@
+import math
 import time
 import gevent
-import schedule
+
+from typing import Callable, Optional
+
+from honeypot.libs.utils import logger
+from honeypot.libs.histogram import Histogram
+
+
+class Job:
+    """
+    单个调度任务
+    按固定节拍执行，节拍由开始时间推算而不是上次结束时间，不会累积漂移。
+    执行耗时超过间隔时跳过错过的节拍，不会堆积执行
+    """
+
+    def __init__(self, func: Callable, interval: float, *args, **kwargs):
+        if interval <= 0:
+            raise RuntimeError(f"调度间隔必须大于 0  {interval}")
+
+        self.func = func
+        self.interval = interval
+        self.args = args
+        self.kwargs = kwargs
+        self.name = getattr(func, "__qualname__", repr(func))
+
+        # 执行统计。lag 为实际开始时间相对计划时间的延迟
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.duration = Histogram()
+        self.lag = Histogram()
+
+        self.greenlet = None
+
+    def start(self):
+        self.greenlet = gevent.spawn(self.loop)
+
+    def stop(self):
+        if self.greenlet:
+            self.greenlet.kill(block=False)
+            self.greenlet = None
+
+    def loop(self):
+        scheduled = time.time() + self.interval
+        while True:
+            delay = scheduled - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+
+            begin = time.time()
+            self.lag.record((begin - scheduled) * 1000)
+            try:
+                self.func(*self.args, **self.kwargs)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"调度任务 {self.name} 执行失败: {e}")
+            finally:
+                self.runs += 1
+                self.duration.record((time.time() - begin) * 1000)
+
+            # 下一个节拍已经错过时，跳到最近的未来节拍
+            scheduled += self.interval
+            behind = time.time() - scheduled
+            if behind > 0:
+                missed = math.ceil(behind / self.interval)
+                self.skipped += missed
+                scheduled += missed * self.interval
 
 
 class ScheduleJob:
     """
     自定义任务调度
+    每个任务一个协程独立计时，慢任务不影响其他任务的节拍；支持小数秒的间隔
     """
     # 有job任务
     has_job = False
@@ -13,25 +80,58 @@ class ScheduleJob:
     # 运行标识
     running = False
 
+    # 已注册的任务
+    jobs = []
+
     @classmethod
-    def add_job(cls, job_func=None, interval=1, *args, **kwargs):
+    def add_job(cls, job_func=None, interval=1, *args, **kwargs) -> Job:
         # 创建任务
-        schedule.every(interval).seconds.do(job_func, *args, **kwargs)
+        job = Job(job_func, interval, *args, **kwargs)
+        cls.jobs.append(job)
+
+        # 调度已经开始时立即启动
+        if cls.running:
+            job.start()
 
         cls.has_job = True
+        return job
 
     @classmethod
     def run(cls):
+        if cls.running:
+            return
+
         cls.running = True
 
-        def worker(sj: ScheduleJob):
-            # 持续调度
-            while sj.has_job:
-                schedule.run_pending()
-                time.sleep(4)
+        # 启动调度任务
+        for job in cls.jobs:
+            job.start()
+
+    @classmethod
+    def stop(cls):
+        """
+        停止所有任务，统计数据保留
+        """
+        for job in cls.jobs:
+            job.stop()
 
-            # 结束调度
-            schedule.clear()
+        cls.running = False
 
-        # 启动调度任务
-        gevent.spawn(worker, cls)
+    @classmethod
+    def summary(cls) -> Optional[dict]:
+        """
+        各任务的执行情况，用于检查监控采集节拍是否准确
+        """
+        if not cls.jobs:
+            return None
+
+        heads = ["任务", "间隔(s)", "执行次数", "跳过节拍", "失败次数", "平均耗时(ms)", "99%耗时(ms)", "最大耗时(ms)",
+                 "平均延迟(ms)", "最大延迟(ms)"]
+        lines = []
+        for job in cls.jobs:
+            lines.append([job.name, job.interval, job.runs, job.skipped, job.failures,
+                          round(job.duration.mean or 0, 1), round(job.duration.percentile(0.99) or 0, 1),
+                          round(job.duration.max / 1000, 1), round(job.lag.mean or 0, 1),
+                          round(job.lag.max / 1000, 1)])
+
+        return {"title": "调度任务", "heads": heads, "lines": lines}
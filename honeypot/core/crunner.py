@@ -1,3 +1,5 @@
+import os
+import json
 import time
 import logging
 
@@ -9,8 +11,16 @@ from locust.runners import MasterRunner, LocalRunner
 from locust.stats import calculate_response_time_percentile as cp
 
 from honeypot.libs.mail import Mail
-from honeypot.libs.monitor import LocalMonitor, KubernetesMonitor
+from honeypot.libs.monitor import LocalMonitor, KubernetesMonitor, PrometheusMonitor, ProcessMonitor
+from honeypot.libs.events import correlate
+from honeypot.libs.render import Canvas, draw, html_report
 from honeypot.core.corntab import ScheduleJob
+from honeypot.core.recorder import HistogramRecorder
+from honeypot.core.reqlog import RequestLog
+from honeypot.core.sidecar import MonitorSidecar
+from honeypot.core.generator import GeneratorMonitor
+from honeypot.core.history import HistoryStore, Regression
+from honeypot.core.variants import Variants
 
 
 class CRunner(metaclass=ABCMeta):
@@ -19,17 +29,42 @@ class CRunner(metaclass=ABCMeta):
     """
     host = ""
 
+    # 多目标对比的目标地址 {名字: 地址}，也可通过 --hosts 指定
+    hosts = {}
+
     @abstractmethod
     def __init__(self, environment: Environment):
         self.env = environment
         self.options = environment.parsed_options
 
+        # 图表输出格式，html 时图表数据保留到交互式报告中，由浏览器绘制
+        Canvas.format = getattr(self.options, "report_format", "png")
+
+        # 各节点都记录响应时间直方图，worker 节点的数据随统计报告汇总到主节点
+        self.recorder = HistogramRecorder(environment)
+
+        # 多目标对比，各节点分别分配目标并记录各目标的统计
+        self.variants = Variants(environment, self.hosts)
+
+        # 施压机自身资源监控，worker 节点的采样通过自定义消息发送到主节点
+        self.generator = GeneratorMonitor(environment)
+
+        # 原始请求日志，各节点写本地文件，测试结束后汇总到主节点
+        self.reqlog = RequestLog(environment) if getattr(self.options, "request_log", False) else None
+
         # 前后置操作通常只需要在主节点执行
         if isinstance(environment.runner, (MasterRunner, LocalRunner)):
 
             # 各阶段的统计数据
             self.aggregates = []
 
+            # 各阶段的时间窗口 [(开始时间戳, 结束时间戳, 成功请求数), ...]
+            self.windows = []
+
+            # 各阶段各接口的统计数据及错误信息，每个阶段一个元组列表
+            self.endpoints = []
+            self.errors = []
+
             # 需要渲染到报告的表格，列表用于保存多个表格对象
             self.tables = []
 
@@ -43,8 +78,36 @@ class CRunner(metaclass=ABCMeta):
             self.lm = LocalMonitor(self.env)
             ScheduleJob.add_job(self.lm.record_metrics, interval=2)
 
-            # k8s监控
-            self.k8s = KubernetesMonitor(self.env.parsed_options.kube_ns, self.env.parsed_options.kube_config)
+            # k8s监控。开启旁路进程时，采集及图表绘制都在子进程中执行；prometheus 后端测试结束时才查询
+            selectors = {"label_selector": getattr(self.options, "kube_labels", None),
+                         "field_selector": getattr(self.options, "kube_fields", None)}
+            sidecar = getattr(self.options, "monitor_sidecar", False)
+            if sidecar and (getattr(self.options, "proc_targets", None) or
+                            getattr(self.options, "monitor_backend", "k8s") == "prometheus"):
+                logging.warning("--monitor_sidecar 只对 k8s 监控后端生效，本次监控不使用旁路进程")
+            elif sidecar and not self.env.parsed_options.kube_ns:
+                logging.warning("未指定 --kube_ns，没有需要监控的对象，不启动旁路监控进程")
+
+            if getattr(self.options, "proc_targets", None):
+                # 非 k8s 部署的被测服务，监控本机进程
+                self.k8s = ProcessMonitor(self.options.proc_targets, getattr(self.options, "proc_interval", 0.5))
+            elif getattr(self.options, "monitor_backend", "k8s") == "prometheus":
+                self.k8s = PrometheusMonitor(self.env.parsed_options.kube_ns,
+                                             getattr(self.options, "prometheus_config", None), self.test_window)
+            elif sidecar and self.env.parsed_options.kube_ns:
+                self.k8s = MonitorSidecar(self.env.parsed_options.kube_ns, self.env.parsed_options.kube_config,
+                                          Canvas.format, **selectors)
+                self.lm.render = self.k8s.render
+            else:
+                self.k8s = KubernetesMonitor(self.env.parsed_options.kube_ns, self.env.parsed_options.kube_config,
+                                             **selectors)
+
+    def test_window(self) -> tuple:
+        """
+        测试时间窗口 (开始时间戳, 结束时间戳)，测试未结束时结束时间为 None
+        """
+        shape = self.env.shape_class
+        return shape.begin / 1000, shape.finish / 1000 if shape.finish else None
 
     def set_up(self):
         """
@@ -60,8 +123,14 @@ class CRunner(metaclass=ABCMeta):
         """
         self.build_introduction()
         self.build_aggregate()
+        self.build_endpoints()
+        self.build_strategy()
+        self.build_efficiency()
+        self.record_history()
 
+        self.collect_generator()
         self.collect_monitor()
+        self.collect_request_log()
 
         self.send_mail()
 
@@ -79,8 +148,19 @@ class CRunner(metaclass=ABCMeta):
         * 测试过程中用户数量发生变化时，框架自动调用 *
         """
         total = self.env.stats.total
-
-        self.aggregates.append({
+        if not total.num_requests:
+            logging.warning("当前阶段没有请求数据，跳过聚合")
+            self.generator.reset()
+            return
+
+        stage = self.env.shape_class.current
+        snapshot = self.recorder.snapshot()
+        histogram = snapshot["total"]
+        self.snapshot_entries()
+        if self.variants.enabled:
+            self.variants.snapshot(total.last_request_timestamp - total.start_time)
+
+        aggregate = {
             "开始时间": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(total.start_time)),
             "并发数量": self.env.runner.user_count,
             "测试时长": str(round(total.last_request_timestamp - total.start_time)) + "s",
@@ -91,6 +171,8 @@ class CRunner(metaclass=ABCMeta):
             "90%ile": str(cp(total.response_times, total.num_requests, 0.9)) + "ms",
             "95%ile": str(cp(total.response_times, total.num_requests, 0.95)) + "ms",
             "99%ile": str(cp(total.response_times, total.num_requests, 0.99)) + "ms",
+            "99.9%ile": str(histogram.percentile(0.999)) + "ms",
+            "99.99%ile": str(histogram.percentile(0.9999)) + "ms",
             "100%ile": str(cp(total.response_times, total.num_requests, 1)) + "ms",
             "请求总数": total.num_requests,
             "QPS": round(total.total_rps, 2),
@@ -98,9 +180,57 @@ class CRunner(metaclass=ABCMeta):
             "fail%": round(total.fail_ratio * 100, 2),
             "FPS": round(total.total_fail_per_sec, 2),
             "PPS": round(total.total_rps - total.total_fail_per_sec, 2)
-        })
+        }
+
+        # 协调遗漏校正后的响应时间分位
+        if self.recorder.co:
+            for percent in (0.9, 0.99, 0.999):
+                aggregate[f"校正{percent * 100:g}%ile"] = str(snapshot["corrected"].percentile(percent)) + "ms"
+
+        # 到达率模式下对比目标到达率与实际达成的到达率
+        if stage.get("rate"):
+            aggregate["目标RPS"] = stage["rate"]
+            aggregate["达成率"] = str(round(total.total_rps / stage["rate"] * 100, 1)) + "%"
+
+        # 开启预热剔除时记录阶段的计入情况
+        if str(getattr(self.options, "warmup", "0")) != "0" or \
+                any("warmup" in item for item in self.env.shape_class.strategies):
+            aggregate["预热剔除"] = str(stage.get("trimmed", 0)) + "s"
+            aggregate["稳态"] = "是" if "trimmed" in stage else "否"
+
+        # 容量探测时记录每轮探测的 SLO 判定结果
+        if "passed" in stage:
+            aggregate["SLO"] = "通过" if stage["passed"] else "未通过"
+
+        # 阶段的时间窗口及成功请求数，测试结束后与资源采样关联计算资源效率
+        self.windows.append((total.start_time, total.last_request_timestamp, total.num_requests - total.num_failures))
+
+        # 施压机饱和时本阶段结果不可信
+        saturated = self.generator.checkpoint()
+        aggregate["施压机"] = "; ".join(f"{node} 饱和(CPU {peak['cpu']}% 延迟 {peak['lag']}ms)"
+                                     for node, peak in saturated) or "正常"
+
+        self.aggregates.append(aggregate)
 
     # ====================== 内置的通用方法 ======================
+    def snapshot_entries(self):
+        """
+        在统计数据重置前，保存当前阶段各接口的统计数据及错误信息
+        """
+        stage = len(self.endpoints) + 1
+        users = self.env.runner.user_count
+
+        lines = []
+        for entry in sorted(self.env.stats.entries.values(), key=lambda x: (x.name, x.method)):
+            lines.append((stage, users, entry.method, entry.name, entry.num_requests, entry.num_failures,
+                          round(entry.avg_response_time, 1), entry.get_response_time_percentile(0.5),
+                          entry.get_response_time_percentile(0.9), entry.get_response_time_percentile(0.99),
+                          round(entry.total_rps, 2), round(entry.fail_ratio * 100, 2)))
+        self.endpoints.append(lines)
+
+        self.errors.append([(stage, users, error.method, error.name, str(error.error), error.occurrences)
+                            for error in self.env.stats.errors.values()])
+
     def build_introduction(self, data: dict = None):
         """
         测试的一些描述信息
@@ -144,12 +274,168 @@ class CRunner(metaclass=ABCMeta):
 
         self.tables.append(data)
 
+    def build_endpoints(self):
+        """
+        将多阶段各接口的统计数据规范成接口聚合报告表格，多接口时绘制各接口随阶段变化的曲线
+        """
+        heads = ["阶段", "并发数量", "方法", "接口", "请求总数", "fails", "平均响应", "50%ile", "90%ile", "99%ile",
+                 "QPS", "fail%"]
+        self.tables.append({"title": "接口聚合报告", "heads": heads,
+                            "lines": [line for lines in self.endpoints for line in lines]})
+
+        errors = [line for lines in self.errors for line in lines]
+        if errors:
+            self.tables.append({"title": "错误统计", "heads": ["阶段", "并发数量", "方法", "接口", "错误", "次数"],
+                                "lines": errors})
+
+        names = sorted({(line[2], line[3]) for lines in self.endpoints for line in lines})
+        if len(names) < 2 or len(self.endpoints) < 2:
+            return
+
+        # x 轴为阶段，每个接口一条曲线；某阶段没有请求的接口记为 0
+        x_axis = [f"#{stage + 1} ({lines[0][1] if lines else 0})" for stage, lines in enumerate(self.endpoints)]
+        stages = [{(line[2], line[3]): line for line in lines} for lines in self.endpoints]
+        p90, qps = [], []
+        for method, name in names:
+            values = [stage.get((method, name)) for stage in stages]
+            p90.append((f"{method} {name}", [line[8] if line else 0 for line in values]))
+            qps.append((f"{method} {name}", [line[10] if line else 0 for line in values]))
+
+        for title, y_axis, y_label in (("Endpoint 90%ile", p90, "response time(ms)"),
+                                       ("Endpoint QPS", qps, "requests/s")):
+            self.charts.append(draw(title, x_axis=x_axis, y_axis=y_axis, title=title, x_label="stage (users)",
+                                    y_label=y_label, x_time=False))
+
+    def build_strategy(self):
+        """
+        收集策略相关的报告表格及图表，如容量探测结果、闭环控制轨迹
+        """
+        self.tables.extend(self.env.shape_class.summary)
+        self.charts.extend(self.env.shape_class.charts)
+
+        if self.variants.enabled:
+            self.tables.extend(self.variants.summary)
+
+    def build_efficiency(self):
+        """
+        资源效率：各阶段时间窗口内各微服务的资源使用量折算到每千个成功请求，以及相对 limits 的余量
+        CPU 以核·秒计(平均核数 x 阶段时长)，内存以 G·秒计
+        """
+        if not self.k8s.status:
+            return
+
+        heads = ["阶段", "微服务", "成功请求数", "平均CPU(核)", "CPU核·秒/千请求", "平均内存(G)", "内存G·秒/千请求",
+                 "CPU余量", "内存余量"]
+        lines = []
+
+        def per_k(value: float, duration: float, success: int):
+            return round(value * duration / success * 1000, 4) if success else "-"
+
+        def headroom(peak: float, limit: float):
+            return f"{round((limit - peak) / limit * 100, 1)}%" if limit else "-"
+
+        for stage, (start, end, success) in enumerate(self.windows, 1):
+            duration = max(end - start, 0)
+            usage = self.k8s.usage_summary(start, end)
+            for service, cpu_avg, cpu_max, mem_avg, mem_max, cpu_limit, mem_limit in usage:
+                lines.append([stage, service, success, cpu_avg, per_k(cpu_avg, duration, success), mem_avg,
+                              per_k(mem_avg, duration, success), headroom(cpu_max, cpu_limit),
+                              headroom(mem_max, mem_limit)])
+
+            # 所有微服务合计
+            if len(usage) > 1:
+                cpu_avg, mem_avg = sum(line[1] for line in usage), sum(line[3] for line in usage)
+                lines.append([stage, "合计", success, round(cpu_avg, 3), per_k(cpu_avg, duration, success),
+                              round(mem_avg, 3), per_k(mem_avg, duration, success), "-", "-"])
+
+        if lines:
+            self.tables.append({"title": "资源效率", "heads": heads, "lines": lines})
+
+    def record_history(self):
+        """
+        保存本次测试结果到历史库，指定基线时做回归对比，存在显著回归时进程以非 0 状态退出
+        """
+        name = getattr(self.options, "run_name", None) or os.path.splitext(self.env.locustfile or "run")[0]
+        snapshots = self.recorder.snapshots
+
+        stages = []
+        for idx, (aggregate, snapshot) in enumerate(zip(self.aggregates, snapshots), 1):
+            stages.append({"stage": idx, "users": aggregate["并发数量"], "requests": aggregate["请求总数"],
+                           "failures": aggregate["fails"], "rps": aggregate["QPS"], "aggregate": aggregate,
+                           "histogram": snapshot["total"]})
+
+        endpoints = []
+        for lines, snapshot in zip(self.endpoints, snapshots):
+            for stage, _, method, endpoint, *values in lines:
+                endpoints.append((stage, method, endpoint, *values, snapshot["entries"].get((method, endpoint))))
+
+        usage = [("k8s", service, metric, avg, peak) for service, *values in self.k8s.usage_summary()
+                 for metric, avg, peak in (("cpu", values[0], values[1]), ("mem", values[2], values[3]))] \
+            if self.k8s.status else []
+        usage.extend(("generator", node, metric, avg, peak) for node, *values in self.generator.usage_summary()
+                     for metric, avg, peak in (("cpu", values[0], values[1]), ("rss", values[2], values[3])))
+
+        store = HistoryStore()
+        options = json.loads(json.dumps(vars(self.options), default=str))
+        run = {"name": name, "locustfile": self.env.locustfile,
+               "strategy": getattr(self.options, "strategy_file", None) or getattr(self.options, "strategy", None),
+               "options": options, "started": self.env.shape_class.begin / 1000,
+               "finished": self.env.shape_class.finish / 1000}
+        run_id = store.save(run, stages, endpoints, usage)
+        logging.info(f"测试结果已保存到历史库: {store.path} (#{run_id} {name})")
+
+        baseline = getattr(self.options, "baseline", None)
+        if not baseline:
+            store.close()
+            return
+
+        baseline_id = store.latest(baseline, exclude=run_id)
+        if baseline_id is None:
+            logging.warning(f"历史库中不存在基线 {baseline}，跳过回归对比")
+            store.close()
+            return
+
+        regression = Regression(getattr(self.options, "regression_alpha", 0.01),
+                                getattr(self.options, "regression_threshold", 10))
+        results = regression.compare(store.histograms(run_id), store.histograms(baseline_id))
+        regressed = [line for line in results if line[-1]]
+
+        store.verdict(run_id, "regression" if regressed else "pass")
+        store.close()
+
+        lines = [[target, base_p50, now_p50, base_p90, now_p90, f"{change}%", f"{p_value:.2e}",
+                  "回归" if flag else "-"]
+                 for target, base_p50, now_p50, base_p90, now_p90, change, p_value, flag in results]
+        self.tables.append({"title": f"回归对比 (基线 {baseline} #{baseline_id})",
+                            "heads": ["对象", "基线50%ile", "本次50%ile", "基线90%ile", "本次90%ile", "90%ile变化",
+                                      "p值", "结论"], "lines": lines})
+
+        if regressed:
+            logging.error(f"相对基线 {baseline} 存在显著的性能回归: {', '.join(line[0] for line in regressed)}")
+            self.env.process_exit_code = 1
+
+    def collect_generator(self):
+        """
+        收集施压机资源使用情况
+        """
+        if self.generator.series:
+            self.tables.append(self.generator.summary)
+            self.charts.extend(self.generator.charts)
+
     def collect_monitor(self):
         """
         收集环境信息，监控图表
         """
         # 实时数据采集
         if ScheduleJob.running:
+            # 停止采集，保证图表数据与调度统计一致
+            ScheduleJob.stop()
+            self.tables.append(ScheduleJob.summary())
+
+            # k8s 事件标注在本地监控图表上
+            if self.k8s.status:
+                self.lm.events = self.k8s.events
+
             # 本地监控
             self.charts.append(self.lm.rps_chart)
             self.charts.append(self.lm.response_time_chart)
@@ -160,21 +446,47 @@ class CRunner(metaclass=ABCMeta):
                 self.tables.append(self.k8s.service_resource)
                 self.tables.append(self.k8s.pod_resource)
 
+                # 事件时间线及事件前后的响应时间异常
+                window = getattr(self.options, "event_window", 30)
+                self.tables.extend(correlate(self.lm.events, self.lm.anomalies(), window))
+
                 # 统计图表
                 self.charts.extend(self.k8s.service_usage_charts)
 
+        # 关闭旁路进程或停止 watch
+        self.k8s.close()
+
+    def collect_request_log(self):
+        """
+        汇总原始请求日志
+        单机模式下 test_stop 监听的执行顺序不确定，先关闭文件以保证最后一批数据及文件尾已写入
+        """
+        if self.reqlog:
+            self.reqlog.close()
+            for path in self.reqlog.collect():
+                logging.info(f"请求日志已保存: {path}")
+
     def send_mail(self, title: str = "性能测试报告", **kwargs):
         """
         发送邮件
         :param title: 报告标题
         """
         mail = Mail(self.env.parsed_options)
+        date = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.env.shape_class.begin / 1000))
+
+        # 交互式报告：图表数据压缩后保存为单个 HTML 文件并作为附件，邮件正文只保留表格
+        charts = self.charts
+        if Canvas.format == "html":
+            path = html_report(self.tables, self.charts, title=title, tester=self.env.parsed_options.tester,
+                               date=date, **kwargs)
+            logging.info(f"交互式报告已保存: {path}")
+            self.annexes.append(path)
+            charts = []
 
         if mail.enable:
             # 生成邮件并发送
-            date = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.env.shape_class.begin / 1000))
-            text = mail.text_instance(title=title, tables=self.tables, charts=[x[0:2] for x in self.charts],
+            text = mail.text_instance(title=title, tables=self.tables, charts=[x[0:2] for x in charts],
                                       tester=self.env.parsed_options.tester, date=date, **kwargs)
             email = mail.mail_instance(content=text, subject=title,
-                                       charts=self.charts, annex_files=self.annexes)
+                                       charts=charts, annex_files=self.annexes)
             mail.send_mail(email)
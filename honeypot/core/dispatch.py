@@ -0,0 +1,98 @@
+import time
+import random
+import gevent
+
+from typing import Optional
+from gevent.event import Event
+from gevent.local import local
+
+
+class Dispatcher:
+    """
+    到达率调度器
+    到达率模式下，所有虚拟用户都从同一个调度器领取请求的计划发送时刻，
+    施压节奏只取决于目标到达率，而不受被测服务响应快慢的影响（开放模型）
+    """
+    # 目标到达率(每秒请求数)，0 表示不限速，即闭合模型
+    rate = 0
+
+    # 到达分布。fixed 均匀到达；poisson 泊松到达
+    arrival = "fixed"
+
+    # 下一个请求的计划发送时刻
+    next_slot = 0.0
+
+    # 计划时刻落后当前时间超过该值(s)时，丢弃积压的到达，避免用户池扩容后出现突发流量
+    max_lag = 1.0
+
+    # 恢复信号。缓冲阶段清除信号，用户保持存活及连接但不发送请求
+    resume = Event()
+    resume.set()
+
+    # 当前执行的阶段序号
+    stage = 0
+
+    # 协程本地的计划发送时刻，用于协调遗漏(coordinated omission)校正
+    intended = local()
+
+    @classmethod
+    def update(cls, rate: float = 0, arrival: str = None, paused: bool = False, stage: int = 0):
+        """
+        更新调度参数
+        分布式模式下，主节点通过自定义消息将每个节点分摊的到达率同步给各 worker
+        :param rate: 目标到达率
+        :param arrival: 到达分布
+        :param paused: 是否暂停发送请求
+        :param stage: 阶段序号
+        """
+        cls.stage = stage
+
+        if arrival:
+            cls.arrival = arrival
+
+        if paused:
+            cls.resume.clear()
+        else:
+            cls.resume.set()
+
+        if rate != cls.rate:
+            cls.rate = rate
+            cls.next_slot = time.time()
+
+    @classmethod
+    def acquire(cls) -> Optional[float]:
+        """
+        领取下一个请求的计划发送时刻，并等待至该时刻
+        暂停期间阻塞等待恢复；不限速时立即返回 None
+        :return: 计划发送时刻(秒级时间戳)
+        """
+        cls.resume.wait()
+
+        if not cls.rate:
+            return None
+
+        now = time.time()
+        if now - cls.next_slot > cls.max_lag:
+            cls.next_slot = now
+
+        slot = cls.next_slot
+        if cls.arrival == "poisson":
+            cls.next_slot += random.expovariate(cls.rate)
+        else:
+            cls.next_slot += 1 / cls.rate
+
+        if slot > now:
+            gevent.sleep(slot - now)
+
+        cls.intended.slot = slot
+        return slot
+
+    @classmethod
+    def pop_intended(cls) -> Optional[float]:
+        """
+        取出当前用户本轮请求的计划发送时刻，只有本轮的第一个请求能取到
+        """
+        slot = getattr(cls.intended, "slot", None)
+        cls.intended.slot = None
+
+        return slot
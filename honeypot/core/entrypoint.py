@@ -159,6 +159,10 @@ class Executor:
         """
         self.env.runner.quit()
 
+        # 存在性能回归等失败结论时以非 0 状态退出，便于流水线判定
+        if getattr(self.env, "process_exit_code", None):
+            sys.exit(self.env.process_exit_code)
+
     def run(self):
         """
         执行入口
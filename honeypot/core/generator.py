@@ -0,0 +1,163 @@
+import os
+import time
+import gevent
+import psutil
+
+from locust.env import Environment
+from locust.runners import WorkerRunner, LocalRunner
+
+from honeypot.libs.utils import logger
+from honeypot.libs.series import TimeSeries
+from honeypot.libs.render import draw
+
+
+class GeneratorMonitor:
+    """
+    施压机自身监控
+    各节点定时采样本进程的 CPU、内存、事件循环延迟及用户协程数量，worker 节点通过自定义消息发送给主节点。
+    施压机饱和时压测结果失真，每个阶段结束时检查各节点是否超过阈值并在聚合报告中标记
+
+    事件循环延迟的测量方式：探测协程每隔 probe 秒让出一次，实际恢复时间与预期的差值即为循环被阻塞的时长
+    """
+
+    # 采样间隔及延迟探测间隔(s)
+    interval = 2
+    probe = 0.1
+
+    columns = ["cpu", "rss", "lag", "greenlets"]
+
+    def __init__(self, environment: Environment):
+        self.env = environment
+        self.cpu_limit = getattr(environment.parsed_options, "gen_cpu_limit", 90)
+        self.lag_limit = getattr(environment.parsed_options, "gen_lag_limit", 50)
+
+        self.process = psutil.Process(os.getpid())
+        self.greenlet = None
+
+        # 当前采样窗口内的最大循环延迟(ms)
+        self.lag = 0.0
+
+        # 主节点保存的各节点采样 {节点: TimeSeries} 及本阶段的峰值 {节点: {"cpu": 峰值, "lag": 峰值}}
+        self.series = {}
+        self.peaks = {}
+
+        if isinstance(environment.runner, WorkerRunner):
+            self.node = environment.runner.client_id
+        else:
+            self.node = "local" if isinstance(environment.runner, LocalRunner) else "master"
+            environment.runner.register_message("generator", self.on_sample)
+
+        environment.events.test_start.add_listener(self.start)
+        environment.events.test_stop.add_listener(self.stop)
+
+    def start(self, **kwargs):
+        if self.greenlet is None:
+            self.process.cpu_percent(None)
+            self.greenlet = gevent.spawn(self.loop)
+
+    def stop(self, **kwargs):
+        if self.greenlet is not None:
+            self.greenlet.kill(block=False)
+            self.greenlet = None
+
+    def loop(self):
+        deadline = time.time() + self.interval
+        while True:
+            expected = time.time() + self.probe
+            gevent.sleep(self.probe)
+            self.lag = max(self.lag, (time.time() - expected) * 1000)
+
+            if time.time() >= deadline:
+                deadline += self.interval
+                self.sample()
+
+    def sample(self):
+        """
+        采集一次本进程的资源使用
+        """
+        data = {
+            "node": self.node,
+            "time": round(time.time(), 2),
+            "values": [self.process.cpu_percent(None), round(self.process.memory_info().rss / 1024 / 1024, 1),
+                       round(self.lag, 1), len(self.env.runner.user_greenlets)]
+        }
+        self.lag = 0.0
+
+        if isinstance(self.env.runner, WorkerRunner):
+            self.env.runner.send_message("generator", data)
+        else:
+            self.record(data)
+
+    def on_sample(self, environment, msg, **kwargs):
+        """
+        主节点接收 worker 的采样
+        """
+        self.record(msg.data)
+
+    def record(self, data: dict):
+        node, (cpu, rss, lag, greenlets) = data["node"], data["values"]
+        self.series.setdefault(node, TimeSeries(self.columns)).append(data["time"], data["values"])
+
+        peak = self.peaks.setdefault(node, {"cpu": 0, "lag": 0})
+        if (cpu >= self.cpu_limit > peak["cpu"]) or (lag >= self.lag_limit > peak["lag"]):
+            logger.warning(f"施压机 {node} 资源不足: CPU {cpu}%  循环延迟 {lag}ms，结果可能失真")
+
+        peak["cpu"] = max(peak["cpu"], cpu)
+        peak["lag"] = max(peak["lag"], lag)
+
+    def reset(self):
+        """
+        丢弃当前的峰值，阶段开始及剔除预热时调用，使饱和标记只覆盖计入聚合的时间窗口
+        """
+        self.peaks = {}
+
+    def checkpoint(self) -> list:
+        """
+        返回本阶段超过阈值的节点及其峰值，并开始新阶段的统计
+        """
+        saturated = [(node, peak) for node, peak in sorted(self.peaks.items())
+                     if peak["cpu"] >= self.cpu_limit or peak["lag"] >= self.lag_limit]
+        self.peaks = {}
+
+        return saturated
+
+    def usage_summary(self) -> list:
+        """
+        各节点的资源使用汇总
+        :return: [(节点, 平均CPU(%), 最大CPU(%), 平均内存(MB), 最大内存(MB)), ...]
+        """
+        lines = []
+        for node, series in sorted(self.series.items()):
+            cpu, rss = series.read("cpu")[1], series.read("rss")[1]
+            lines.append((node, round(sum(cpu) / len(cpu), 1), max(series.read("cpu", "max")[1]),
+                          round(sum(rss) / len(rss), 1), max(series.read("rss", "max")[1])))
+
+        return lines
+
+    @property
+    def summary(self) -> dict:
+        """
+        各节点资源使用汇总
+        """
+        heads = ["节点", "平均CPU(%)", "最大CPU(%)", "最大内存(MB)", "平均循环延迟(ms)", "最大循环延迟(ms)", "最大用户协程"]
+        lines = []
+        for node, series in sorted(self.series.items()):
+            cpu, lag = series.read("cpu")[1], series.read("lag")[1]
+            lines.append([node, round(sum(cpu) / len(cpu), 1), max(series.read("cpu", "max")[1]),
+                          max(series.read("rss", "max")[1]), round(sum(lag) / len(lag), 1),
+                          max(series.read("lag", "max")[1]), int(max(series.read("greenlets", "max")[1]))])
+
+        return {"title": "施压机资源", "heads": heads, "lines": lines}
+
+    @property
+    def charts(self) -> list:
+        """
+        每个节点一张 CPU 及循环延迟图表
+        """
+        charts = []
+        for node, series in sorted(self.series.items()):
+            title = f"Generator {node}"
+            y_axis = [("cpu(%)", series.read("cpu", "max")[1]), ("loop lag(ms)", series.read("lag", "max")[1])]
+            charts.append(draw(title, x_axis=series["time"], y_axis=y_axis, title=title, y_label="cpu(%) / lag(ms)"))
+
+        return charts
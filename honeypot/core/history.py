@@ -0,0 +1,223 @@
+import os
+import json
+import math
+import time
+import sqlite3
+
+from typing import Optional
+
+from honeypot import REPORT_DIR
+from honeypot.libs.histogram import Histogram
+
+
+class HistoryStore:
+    """
+    测试历史
+    每次测试的策略、各阶段聚合结果、各接口分位值、资源使用及响应时间直方图保存到本地 SQLite，
+    可按名字取出基线运行，与本次结果做统计对比
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            locustfile TEXT,
+            strategy TEXT,
+            options TEXT,
+            started REAL,
+            finished REAL,
+            verdict TEXT
+        );
+        CREATE TABLE IF NOT EXISTS stages (
+            run_id INTEGER NOT NULL,
+            stage INTEGER NOT NULL,
+            users INTEGER,
+            requests INTEGER,
+            failures INTEGER,
+            rps REAL,
+            avg REAL,
+            p50 REAL,
+            p90 REAL,
+            p99 REAL,
+            p999 REAL,
+            aggregate TEXT,
+            histogram TEXT
+        );
+        CREATE TABLE IF NOT EXISTS endpoints (
+            run_id INTEGER NOT NULL,
+            stage INTEGER NOT NULL,
+            method TEXT,
+            name TEXT,
+            requests INTEGER,
+            failures INTEGER,
+            avg REAL,
+            p50 REAL,
+            p90 REAL,
+            p99 REAL,
+            rps REAL,
+            fail_ratio REAL,
+            histogram TEXT
+        );
+        CREATE TABLE IF NOT EXISTS usage (
+            run_id INTEGER NOT NULL,
+            source TEXT,
+            target TEXT,
+            metric TEXT,
+            avg REAL,
+            max REAL
+        );
+        CREATE INDEX IF NOT EXISTS runs_name ON runs (name);
+        CREATE INDEX IF NOT EXISTS stages_run ON stages (run_id);
+        CREATE INDEX IF NOT EXISTS endpoints_run ON endpoints (run_id);
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(REPORT_DIR, "history.db")
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(self.schema)
+
+    def close(self):
+        self.conn.close()
+
+    def save(self, run: dict, stages: list, endpoints: list, usage: list) -> int:
+        """
+        保存一次测试
+        :param run: {"name", "locustfile", "strategy", "options", "started", "finished", "verdict"}
+        :param stages: [{"stage", "users", "requests", "failures", "rps", "aggregate", "histogram": Histogram}, ...]
+        :param endpoints: [(stage, method, name, requests, failures, avg, p50, p90, p99, rps, fail%, Histogram), ...]
+        :param usage: [(来源, 对象, 指标, 平均值, 最大值), ...]
+        :return: 运行序号
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (name, locustfile, strategy, options, started, finished, verdict) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run["name"], run.get("locustfile"), run.get("strategy"), json.dumps(run.get("options", {})),
+                 run.get("started"), run.get("finished", time.time()), run.get("verdict")))
+            run_id = cursor.lastrowid
+
+            for stage in stages:
+                histogram = stage["histogram"]
+                self.conn.execute(
+                    "INSERT INTO stages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, stage["stage"], stage.get("users"), stage.get("requests"), stage.get("failures"),
+                     stage.get("rps"), histogram.mean, histogram.percentile(0.5), histogram.percentile(0.9),
+                     histogram.percentile(0.99), histogram.percentile(0.999),
+                     json.dumps(stage.get("aggregate", {}), ensure_ascii=False), json.dumps(histogram.serialize())))
+
+            self.conn.executemany(
+                "INSERT INTO endpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, *line[:-1], json.dumps(line[-1].serialize()) if line[-1] else None) for line in endpoints])
+
+            self.conn.executemany("INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(run_id, *line) for line in usage])
+
+        return run_id
+
+    def verdict(self, run_id: int, verdict: str):
+        with self.conn:
+            self.conn.execute("UPDATE runs SET verdict = ? WHERE id = ?", (verdict, run_id))
+
+    def latest(self, name: str, exclude: int = None) -> Optional[int]:
+        """
+        指定名字的最近一次运行，判定为回归的运行不作为基线
+        name 为 #运行编号 时固定以该次运行为基线
+        """
+        if name.startswith("#") and name[1:].isdigit():
+            row = self.conn.execute("SELECT id FROM runs WHERE id = ? AND id != ?",
+                                    (int(name[1:]), exclude or -1)).fetchone()
+        else:
+            row = self.conn.execute("SELECT id FROM runs WHERE name = ? AND id != ? AND "
+                                    "(verdict IS NULL OR verdict != 'regression') ORDER BY id DESC LIMIT 1",
+                                    (name, exclude or -1)).fetchone()
+        return row[0] if row else None
+
+    def histograms(self, run_id: int) -> dict:
+        """
+        取出一次运行的直方图
+        :return: {"stages": {阶段: Histogram}, "endpoints": {(方法, 接口): 各阶段合并的 Histogram}}
+        """
+        stages = {stage: Histogram.deserialize(json.loads(data)) for stage, data in
+                  self.conn.execute("SELECT stage, histogram FROM stages WHERE run_id = ?", (run_id,))}
+
+        endpoints = {}
+        for method, name, data in self.conn.execute(
+                "SELECT method, name, histogram FROM endpoints WHERE run_id = ? AND histogram IS NOT NULL", (run_id,)):
+            histogram = Histogram.deserialize(json.loads(data))
+            if (method, name) in endpoints:
+                endpoints[(method, name)].merge(histogram)
+            else:
+                endpoints[(method, name)] = histogram
+
+        return {"stages": stages, "endpoints": endpoints}
+
+
+class Regression:
+    """
+    性能回归判定
+    对每个阶段及每个接口，用 Mann-Whitney U 检验(单侧)判断本次响应时间分布是否显著大于基线，
+    显著性水平按检验次数做 Bonferroni 校正。样本量很大时微小差异也会显著，因此同时要求 90%ile 的增幅超过阈值
+    """
+
+    def __init__(self, alpha: float = 0.01, threshold: float = 10):
+        """
+        :param alpha: 显著性水平
+        :param threshold: 90%ile 增幅阈值(百分比)
+        """
+        self.alpha = alpha
+        self.threshold = threshold
+
+    @staticmethod
+    def mann_whitney(current: Histogram, baseline: Histogram) -> float:
+        """
+        基于直方图的 Mann-Whitney U 检验，同一个桶内的样本视为相同值(秩取平均)
+        :return: 单侧 p 值，H1: 本次的响应时间大于基线
+        """
+        n1, n2 = current.count, baseline.count
+        if not n1 or not n2:
+            return 1.0
+
+        indexes = sorted(set(current.counts) | set(baseline.counts))
+        u = 0.0
+        below = 0
+        ties = 0
+        for index in indexes:
+            a, b = current.counts.get(index, 0), baseline.counts.get(index, 0)
+            u += a * (below + b / 2)
+            below += b
+            ties += (a + b) ** 3 - (a + b)
+
+        total = n1 + n2
+        mean = n1 * n2 / 2
+        variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1))) if total > 1 else 0
+        if variance <= 0:
+            return 1.0
+
+        z = (u - mean - 0.5) / math.sqrt(variance)
+        return 0.5 * math.erfc(z / math.sqrt(2))
+
+    def compare(self, current: dict, baseline: dict) -> list:
+        """
+        对比两次运行的直方图
+        :return: [(对象, 基线50%ile, 本次50%ile, 基线90%ile, 本次90%ile, 90%ile变化(%), p值, 是否回归), ...]
+        """
+        pairs = [(f"阶段 {stage}", histogram, baseline["stages"][stage])
+                 for stage, histogram in sorted(current["stages"].items()) if stage in baseline["stages"]]
+        pairs.extend((f"{method} {name}", histogram, baseline["endpoints"][(method, name)])
+                     for (method, name), histogram in sorted(current["endpoints"].items())
+                     if (method, name) in baseline["endpoints"])
+
+        alpha = self.alpha / max(len(pairs), 1)
+        results = []
+        for target, now, base in pairs:
+            if not now.count or not base.count:
+                continue
+
+            p_value = self.mann_whitney(now, base)
+            base_p90, now_p90 = base.percentile(0.9), now.percentile(0.9)
+            change = (now_p90 - base_p90) / base_p90 * 100 if base_p90 else 0.0
+            regressed = p_value < alpha and change >= self.threshold
+            results.append((target, base.percentile(0.5), now.percentile(0.5), base_p90, now_p90,
+                            round(change, 1), p_value, regressed))
+
+        return results
@@ -2,8 +2,9 @@ import os
 import traceback
 
 from locust import events, stats
-from locust.runners import MasterRunner, LocalRunner
+from locust.runners import MasterRunner, LocalRunner, WorkerRunner
 
+from honeypot.core.dispatch import Dispatcher
 from honeypot.core.strategy import DefaultStrategy
 from honeypot.libs.utils import logger
 
@@ -20,6 +21,54 @@ def _(parser):
     # 策略配置
     parser.add_argument("--strategy", show=True, help="测试策略 开始并发数_结束并发数_步进数_持续时间(s)")
     parser.add_argument("--strategy_mode", show=True, type=int, default=0, help="策略模式。0 并发间配置间隔；1 并发间没有间隔；2 去掉所有缓冲时间")
+    parser.add_argument("--keep_alive", show=True, action="store_true", default=False,
+                        help="缓冲阶段保持虚拟用户及连接存活，仅暂停请求")
+    parser.add_argument("--strategy_file", show=True,
+                        help="策略文件名(yaml/json)，放在 config 目录下。指定后忽略 --strategy 和 --strategy_mode")
+    parser.add_argument("--strategy_type", show=True, default="users", choices=["users", "rate", "search", "control"],
+                        help="策略类型。users 按并发数施压；rate 按到达率施压，策略中的并发数即目标RPS；"
+                             "search 按SLO自动探测容量，策略为 起始负载_最大负载_探测精度_每轮时长(s)；"
+                             "control 闭环控制负载，策略为 起始负载_最大负载_单次最大调节量_控制总时长(s)")
+    parser.add_argument("--arrival", show=True, default="fixed", choices=["fixed", "poisson"],
+                        help="到达率模式下请求的到达分布。fixed 均匀到达；poisson 泊松到达")
+    parser.add_argument("--search_by", show=True, default="users", choices=["users", "rate"],
+                        help="容量探测的负载维度。users 并发数；rate 到达率")
+    parser.add_argument("--slo_percentile", show=True, type=float, default=0.99, help="容量探测SLO的响应时间分位")
+    parser.add_argument("--slo_rt", show=True, type=float, default=500, help="容量探测SLO的响应时间上限(ms)")
+    parser.add_argument("--slo_fail", show=True, type=float, default=1.0, help="容量探测SLO的失败率上限(百分比)")
+    parser.add_argument("--slo_rate", show=True, type=float, default=95.0,
+                        help="按到达率探测时实际RPS占目标到达率的下限(百分比)，低于该值判定为未通过")
+    parser.add_argument("--control_by", show=True, default="users", choices=["users", "rate"],
+                        help="闭环控制的负载维度。users 并发数；rate 到达率")
+    parser.add_argument("--control_target", show=True, default="rt", choices=["rt", "cpu"],
+                        help="闭环控制的目标。rt 响应时间；cpu k8s微服务CPU使用率(占limits百分比)")
+    parser.add_argument("--target_rt", show=True, type=float, default=200, help="闭环控制的目标响应时间(ms)")
+    parser.add_argument("--target_percentile", show=True, type=float, default=0.95, help="闭环控制的目标响应时间分位")
+    parser.add_argument("--target_cpu", show=True, type=float, default=70, help="闭环控制的目标CPU使用率")
+    parser.add_argument("--control_interval", show=True, type=int, default=5, help="闭环控制的调节周期(s)")
+    parser.add_argument("--pid", show=True, default="1_0.2_0.1", help="闭环控制的PID参数 Kp_Ki_Kd")
+    parser.add_argument("--warmup", show=True, default="0",
+                        help="每个阶段剔除的预热时长(s)，auto 表示根据RPS与响应时间的变异系数自动检测稳态")
+    parser.add_argument("--steady_cv", show=True, type=float, default=0.1, help="稳态检测的变异系数阈值")
+    parser.add_argument("--steady_window", show=True, type=int, default=10, help="稳态检测的滑动窗口(s)")
+    parser.add_argument("--steady_min", show=True, type=int, default=0, help="阶段进入稳态后至少计入的时长(s)")
+    parser.add_argument("--steady_extend", show=True, type=int, default=0, help="计入时长不足时阶段最多延长的时长(s)")
+    parser.add_argument("--steady_early", show=True, action="store_true", default=False,
+                        help="阶段稳态计入时长满足 steady_min 后提前结束")
+    parser.add_argument("--max_users", show=True, type=int, default=1000, help="到达率模式下虚拟用户池的上限")
+
+    # 统计配置
+    parser.add_argument("--hdr_digits", show=True, type=int, default=2, help="响应时间直方图的有效数字位数")
+    parser.add_argument("--hdr_max_entries", show=True, type=int, default=500, help="响应时间直方图记录的接口数量上限")
+
+    parser.add_argument("--co_correct", show=True, action="store_true", default=False,
+                        help="开启协调遗漏校正，报告中增加校正后的响应时间分位")
+    parser.add_argument("--co_interval", show=True, type=float, default=0,
+                        help="协调遗漏校正时并发模式下期望的请求间隔(ms)，默认取响应时间的滑动均值")
+
+    parser.add_argument("--request_log", show=True, action="store_true", default=False,
+                        help="记录原始请求日志(列式二进制文件)，保存到 report/requests 目录")
+    parser.add_argument("--request_log_batch", show=True, type=int, default=65536, help="原始请求日志每批落盘的记录数")
 
     # 测试人员
     parser.add_argument("--tester", show=True, default="罐仔", help="测试人员名字")
@@ -27,6 +76,35 @@ def _(parser):
     # k8s 配置
     parser.add_argument("--kube_ns", show=True, help="kubernetes namespace 名称")
     parser.add_argument("--kube_config", show=True, help="kubernetes kube_config 文件名称，需要手动挂在到config路径下")
+    parser.add_argument("--monitor_backend", show=True, default="k8s", choices=["k8s", "prometheus"],
+                        help="k8s资源监控后端。k8s 测试过程中轮询 metrics 接口；prometheus 测试结束后按时间窗口范围查询")
+    parser.add_argument("--prometheus_config", show=True, default="prometheus.yaml",
+                        help="prometheus 后端的配置文件名，需要手动挂在到config路径下")
+    parser.add_argument("--event_window", show=True, type=int, default=30,
+                        help="k8s 事件与响应时间异常关联的时间范围(s)")
+    parser.add_argument("--proc_targets", show=True, nargs="+", default=[],
+                        help="本机进程监控目标，多个用空格隔开，写为 pid:进程号、name:正则、cgroup:路径子串，指定时不做k8s监控")
+    parser.add_argument("--proc_interval", show=True, type=float, default=0.5, help="本机进程监控的采样间隔(s)")
+    parser.add_argument("--kube_labels", show=True, help="kubernetes 标签选择器，限定监控的 pod、副本集及指标范围，如 app=web")
+    parser.add_argument("--kube_fields", show=True, help="kubernetes 字段选择器，只作用于 pod，如 status.phase=Running")
+    parser.add_argument("--gen_cpu_limit", show=True, type=float, default=90,
+                        help="施压机CPU使用率阈值(百分比)，超过时标记该阶段结果不可信")
+    parser.add_argument("--gen_lag_limit", show=True, type=float, default=50,
+                        help="施压机事件循环延迟阈值(ms)，超过时标记该阶段结果不可信")
+    parser.add_argument("--hosts", show=True, nargs="+", default=[],
+                        help="多目标对比的目标地址，多个用空格隔开，可写为 名字=地址")
+    parser.add_argument("--variant_split", show=True, choices=["user", "request"], default="user",
+                        help="多目标的流量分配方式。user 按用户分配；request 按请求分配")
+    parser.add_argument("--variant_ratio", show=True, help="多目标的流量比例，如 1_1、7_3")
+    parser.add_argument("--run_name", show=True, help="本次测试在历史库中的名字，默认为脚本文件名")
+    parser.add_argument("--baseline", show=True, help="回归对比的基线名字，取历史库中该名字最近一次未判定为回归的运行；#运行编号 固定基线")
+    parser.add_argument("--regression_alpha", show=True, type=float, default=0.01, help="回归判定的显著性水平")
+    parser.add_argument("--regression_threshold", show=True, type=float, default=10,
+                        help="回归判定的90分位响应时间的增幅阈值(百分比)")
+    parser.add_argument("--report_format", show=True, choices=["png", "html"], default="png",
+                        help="报告图表格式。png 邮件内嵌图片；html 生成交互式HTML报告作为附件，邮件只保留表格")
+    parser.add_argument("--monitor_sidecar", show=True, action="store_true", default=False,
+                        help="在独立子进程中运行k8s监控采集及图表绘制，避免占用施压进程")
 
     # 邮件相关配置
     parser.add_argument("--smtp_server", show=True, default='smtp.exmail.qq.com', help="邮箱服务地址")
@@ -37,6 +115,16 @@ def _(parser):
     parser.add_argument("--recipients", show=True, nargs="+", default=[], help="收件人邮箱 多个用空格隔开")
 
 
+@events.init.add_listener
+def _(environment, runner, **kwargs):
+    """
+    注册节点间的自定义消息
+    """
+    if isinstance(runner, WorkerRunner):
+        # 接收主节点下发的到达率
+        runner.register_message("dispatch", lambda environment, msg, **kw: Dispatcher.update(**msg.data))
+
+
 @events.test_start.add_listener
 def _(environment, **kwargs):
     """
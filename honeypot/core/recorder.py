@@ -0,0 +1,126 @@
+import time
+
+from locust.env import Environment
+from locust.runners import WorkerRunner
+
+from honeypot.core.dispatch import Dispatcher
+from honeypot.libs.histogram import Histogram
+
+
+class HistogramRecorder:
+    """
+    直方图统计
+    监听请求事件，为整体及每个接口记录 HDR 直方图；worker 节点随统计报告上报增量，主节点合并。
+    每个阶段结束时冻结为快照保存，所有阶段的直方图都可用于事后对比
+
+    开启协调遗漏(coordinated omission)校正时，额外记录一份校正后的整体直方图：
+        到达率模式下，以计划发送时刻而非实际发送时刻为起点计算响应时间；
+        并发模式下，按期望的请求间隔回填慢请求期间本应发出的请求(同 HdrHistogram recordValueWithExpectedInterval)
+    """
+
+    # 超出接口数量上限后，新接口统一记录到该条目
+    other = ("", "Other")
+
+    def __init__(self, environment: Environment):
+        self.env = environment
+        self.digits = getattr(environment.parsed_options, "hdr_digits", 2)
+        self.max_entries = getattr(environment.parsed_options, "hdr_max_entries", 500)
+
+        # 协调遗漏校正。期望的请求间隔(ms)，为 0 时取响应时间的滑动均值
+        self.co = getattr(environment.parsed_options, "co_correct", False)
+        self.co_interval = getattr(environment.parsed_options, "co_interval", 0)
+        self.expected = 0.0
+
+        # 当前阶段的直方图
+        self.total = Histogram(self.digits)
+        self.corrected = Histogram(self.digits)
+        self.entries = {}
+
+        # 各阶段的快照 [{"total": Histogram, "corrected": Histogram, "entries": {(method, name): Histogram}}, ...]
+        self.snapshots = []
+
+        environment.events.request.add_listener(self.on_request)
+        if isinstance(environment.runner, WorkerRunner):
+            environment.events.report_to_master.add_listener(self.on_report_to_master)
+        else:
+            environment.events.worker_report.add_listener(self.on_worker_report)
+
+    def entry(self, method: str, name: str) -> Histogram:
+        key = (method, name)
+        if key not in self.entries:
+            if len(self.entries) >= self.max_entries:
+                key = self.other
+
+            self.entries.setdefault(key, Histogram(self.digits))
+
+        return self.entries[key]
+
+    def on_request(self, request_type, name, response_time, **kwargs):
+        if response_time is None:
+            return
+
+        self.total.record(response_time)
+        self.entry(request_type, name).record(response_time)
+
+        if self.co:
+            self.correct(response_time)
+
+    def correct(self, response_time: float):
+        """
+        记录校正后的响应时间
+        """
+        if Dispatcher.rate:
+            intended = Dispatcher.pop_intended()
+            delay = max(time.time() - response_time / 1000 - intended, 0) * 1000 if intended else 0
+            self.corrected.record(response_time + delay)
+            return
+
+        self.corrected.record(response_time)
+
+        self.expected = self.expected * 0.99 + response_time * 0.01 if self.expected else response_time
+        interval = self.co_interval or self.expected
+        if not interval:
+            return
+
+        missing = response_time - interval
+        while missing >= interval:
+            self.corrected.record(missing)
+            missing -= interval
+
+    def on_report_to_master(self, client_id, data: dict):
+        """
+        worker 上报增量直方图后清空本地数据
+        """
+        data["hdr"] = {
+            "total": self.total.serialize(),
+            "corrected": self.corrected.serialize(),
+            "entries": [[method, name, histogram.serialize()] for (method, name), histogram in self.entries.items()]
+        }
+        self.reset()
+
+    def on_worker_report(self, client_id, data: dict):
+        """
+        主节点合并 worker 上报的直方图
+        """
+        if "hdr" not in data:
+            return
+
+        self.total.merge(Histogram.deserialize(data["hdr"]["total"]))
+        self.corrected.merge(Histogram.deserialize(data["hdr"]["corrected"]))
+        for method, name, histogram in data["hdr"]["entries"]:
+            self.entry(method, name).merge(Histogram.deserialize(histogram))
+
+    def reset(self):
+        self.total = Histogram(self.digits)
+        self.corrected = Histogram(self.digits)
+        self.entries = {}
+
+    def snapshot(self) -> dict:
+        """
+        冻结当前阶段的直方图，并开始新阶段的统计
+        """
+        snapshot = {"total": self.total, "corrected": self.corrected, "entries": self.entries}
+        self.snapshots.append(snapshot)
+        self.reset()
+
+        return snapshot
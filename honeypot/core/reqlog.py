@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import gevent
+import struct
+
+from array import array
+from typing import Optional
+from gevent.lock import Semaphore
+from gevent.threadpool import ThreadPool
+from locust.env import Environment
+from locust.runners import WorkerRunner, MasterRunner
+
+from honeypot import REPORT_DIR
+from honeypot.core.dispatch import Dispatcher
+from honeypot.libs.utils import logger, path_builder
+
+
+class RequestLog:
+    """
+    原始请求日志
+    监听请求事件，将每个请求按列写入预分配的数组，写满一批后交给后台线程批量落盘。
+    缓冲区数量固定，后台写入跟不上时丢弃新记录并计数，内存占用有上限。
+    文件关闭(测试结束)后到达的请求同样计入丢弃数，但不会出现在已写入的文件尾中。
+    分布式模式下各 worker 写本地文件，测试结束后分块发送给主节点保存
+
+    文件格式(小端序，大端机器上写入和读取时转换字节序):
+        文件头: b"HPRL" + 版本号(uint8)
+        数据块: b"B" + 行数 n(uint32)，随后依次为各列的 n 个值
+            timestamp   float64   请求结束时间(秒级时间戳)
+            latency     float32   响应时间(ms)
+            size        uint32    响应长度
+            code        uint16    HTTP 状态码，无响应时为 0
+            failed      uint8     1 失败，0 成功
+            name        uint16    接口序号，对应文件尾 names 中的 "方法 接口"，超出上限的接口记为 65535
+            stage       uint16    阶段序号
+        文件尾: b"D" + 长度(uint32) + UTF-8 JSON {"worker": 节点标识, "names": [...], "dropped": 丢弃数}
+    """
+
+    magic = b"HPRL"
+    version = 1
+
+    # 列名及类型
+    columns = (("timestamp", "d"), ("latency", "f"), ("size", "I"), ("code", "H"), ("failed", "B"),
+               ("name", "H"), ("stage", "H"))
+
+    # 缓冲区数量
+    buffers = 4
+
+    # 发送文件的分块大小
+    chunk = 1024 * 1024
+
+    def __init__(self, environment: Environment):
+        self.env = environment
+        self.batch = getattr(environment.parsed_options, "request_log_batch", 65536)
+        self.directory = path_builder(os.path.join(REPORT_DIR, "requests"))
+
+        # 接口名称的字典编码
+        self.names = {}
+        self.dropped = 0
+
+        # 当前写入的缓冲区及写入位置
+        self.free = [self.allocate() for _ in range(self.buffers)]
+        self.buffer = self.free.pop()
+        self.cursor = 0
+
+        # 单线程的后台写入，保证数据块顺序
+        self.pool = ThreadPool(1)
+        self.worker = None
+        self.file = None
+        self.path = None
+        self.closed = False
+        self.lock = Semaphore()
+
+        # 主节点已接收的 worker 文件
+        self.received = {}
+        self.finished = set()
+
+        if isinstance(environment.runner, MasterRunner):
+            environment.runner.register_message("request_log", self.on_chunk)
+        else:
+            environment.events.request.add_listener(self.on_request)
+            environment.events.test_stop.add_listener(self.on_test_stop)
+
+    def allocate(self) -> list:
+        return [array(typecode, bytes(array(typecode).itemsize * self.batch)) for _, typecode in self.columns]
+
+    def open(self):
+        if isinstance(self.env.runner, WorkerRunner):
+            self.worker = self.env.runner.client_id
+        else:
+            self.worker = "local"
+
+        self.path = os.path.join(self.directory, f"requests-{self.worker}.hprl")
+        self.file = open(self.path, "wb")
+        self.file.write(self.magic + struct.pack("<B", self.version))
+
+    def on_request(self, request_type, name, response_time, response_length, exception=None, response=None,
+                   **kwargs):
+        # 文件关闭后仍在途的请求不再写入，计入丢弃数(已写入的文件尾不包含这部分)
+        if self.closed:
+            self.dropped += 1
+            return
+
+        if self.cursor >= self.batch:
+            if not self.flush():
+                self.dropped += 1
+                return
+
+        key = f"{request_type} {name}"
+        index = self.names.get(key)
+        if index is None:
+            index = 65535
+            if len(self.names) < 65535:
+                index = self.names[key] = len(self.names)
+
+        i = self.cursor
+        timestamp, latency, size, code, failed, names, stage = self.buffer
+        timestamp[i] = time.time()
+        latency[i] = response_time or 0
+        size[i] = min(response_length or 0, 4294967295)
+        code[i] = getattr(response, "status_code", 0) or 0
+        failed[i] = 1 if exception else 0
+        names[i] = index
+        stage[i] = min(Dispatcher.stage, 65535)
+        self.cursor += 1
+
+    def flush(self) -> bool:
+        """
+        将当前缓冲区交给后台线程落盘，无空闲缓冲区时返回 False
+        """
+        if not self.cursor:
+            return True
+
+        if not self.free:
+            return False
+
+        if self.file is None:
+            self.open()
+
+        buffer, rows = self.buffer, self.cursor
+        self.buffer = self.free.pop()
+        self.cursor = 0
+        self.pool.spawn(self.write, buffer, rows)
+
+        return True
+
+    def write(self, buffer: list, rows: int):
+        """
+        后台线程中写入一个数据块，写完后归还缓冲区
+        """
+        self.file.write(b"B" + struct.pack("<I", rows))
+        for column in buffer:
+            if sys.byteorder == "big":
+                column = column[:rows]
+                column.byteswap()
+            self.file.write(memoryview(column)[:rows])
+
+        self.free.append(buffer)
+
+    def close(self) -> Optional[str]:
+        """
+        写入剩余数据及文件尾，返回文件路径，重复调用时直接返回
+        """
+        with self.lock:
+            if self.closed:
+                return self.path
+
+            while not self.flush():
+                gevent.sleep(0.01)
+
+            self.closed = True
+            if self.file is None:
+                return None
+
+            self.pool.join()
+            footer = json.dumps({"worker": self.worker, "names": list(self.names),
+                                 "dropped": self.dropped}).encode("utf8")
+            self.file.write(b"D" + struct.pack("<I", len(footer)) + footer)
+            self.file.close()
+
+            if self.dropped:
+                logger.warning(f"请求日志写入跟不上，丢弃 {self.dropped} 条记录")
+
+            return self.path
+
+    def on_test_stop(self, environment, **kwargs):
+        """
+        测试结束时关闭文件，worker 节点将文件发送给主节点
+        """
+        path = self.close()
+        if not isinstance(environment.runner, WorkerRunner):
+            return
+
+        if not path:
+            environment.runner.send_message("request_log", {"name": None, "data": b"", "last": True})
+            return
+
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(self.chunk)
+                last = len(data) < self.chunk
+                environment.runner.send_message("request_log", {"name": os.path.basename(path), "data": data,
+                                                                "last": last})
+                if last:
+                    break
+
+    def on_chunk(self, environment, msg, **kwargs):
+        """
+        主节点接收 worker 发送的文件块
+        """
+        name = msg.data["name"]
+        if name:
+            mode = "ab" if name in self.received else "wb"
+            with open(os.path.join(self.directory, name), mode) as f:
+                f.write(msg.data["data"])
+            self.received[name] = self.received.get(name, 0) + len(msg.data["data"])
+
+        if msg.data["last"]:
+            self.finished.add(msg.node_id)
+
+    def collect(self, timeout: int = 30) -> list:
+        """
+        等待所有 worker 的请求日志，返回已保存的文件路径
+        """
+        if isinstance(self.env.runner, MasterRunner):
+            deadline = time.time() + timeout
+            workers = getattr(self.env.parsed_options, "expect_workers", 1)
+            while len(self.finished) < workers and time.time() < deadline:
+                gevent.sleep(0.5)
+
+            return [os.path.join(self.directory, name) for name in self.received]
+
+        return [self.path] if self.path else []
+
+    @classmethod
+    def read(cls, path: str) -> dict:
+        """
+        读取请求日志文件，返回按列组织的数据
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+
+        if content[:4] != cls.magic:
+            raise RuntimeError(f"不是有效的请求日志文件  {path}")
+
+        data = {name: array(typecode) for name, typecode in cls.columns}
+        meta = {}
+        offset = 5
+        while offset < len(content):
+            flag = content[offset:offset + 1]
+            (size,) = struct.unpack_from("<I", content, offset + 1)
+            offset += 5
+
+            if flag == b"D":
+                meta = json.loads(content[offset:offset + size].decode("utf8"))
+                offset += size
+                continue
+
+            for name, typecode in cls.columns:
+                length = array(typecode).itemsize * size
+                column = array(typecode, content[offset:offset + length])
+                if sys.byteorder == "big":
+                    column.byteswap()
+                data[name].extend(column)
+                offset += length
+
+        data["names"] = meta.get("names", [])
+        data["worker"] = meta.get("worker")
+        return data
@@ -0,0 +1,178 @@
+import os
+import sys
+import pickle
+import subprocess
+
+from typing import Optional
+from gevent.lock import Semaphore
+from email.mime.image import MIMEImage
+
+from honeypot import BASE_DIR
+from honeypot.libs.cio import send, receive
+from honeypot.libs.utils import logger
+
+
+class MonitorSidecar:
+    """
+    旁路监控进程
+    在子进程中运行 k8s 资源采集及图表绘制，与施压的协程循环隔离，避免解析大体积的指标数据时阻塞用户调度。
+    子进程启动后先打 gevent 补丁再加载框架，通过标准输入输出上的长度前缀帧通信。
+    对外提供与 KubernetesMonitor 一致的属性，CRunner 无需区分监控运行在哪个进程
+    """
+
+    # 实例状态，默认不可用
+    status = False
+
+    # 子进程入口
+    bootstrap = "from gevent import monkey; monkey.patch_all(); from honeypot.core.sidecar import serve; serve()"
+
+    def __init__(self, namespace=None, config_yaml=None, report_format="png", label_selector=None,
+                 field_selector=None):
+        self.lock = Semaphore()
+        path = os.pathsep.join(filter(None, [BASE_DIR, os.environ.get("PYTHONPATH")]))
+        self.process = subprocess.Popen([sys.executable, "-c", self.bootstrap],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        env={**os.environ, "PYTHONPATH": path})
+
+        # 子进程完成 k8s 初始化后返回状态
+        reply = self.request("init", namespace=namespace, config_yaml=config_yaml, report_format=report_format,
+                             label_selector=label_selector, field_selector=field_selector)
+        self.status = bool(reply and reply["status"])
+
+        # 报告数据在测试结束时一次性取回
+        self.report = None
+
+    def request(self, command: str, **kwargs):
+        """
+        发送命令并等待结果，子进程异常退出时返回 None
+        """
+        with self.lock:
+            if self.process.poll() is not None:
+                return None
+
+            try:
+                send(self.process.stdin, {"command": command, **kwargs})
+                reply = receive(self.process.stdout)
+            except (OSError, EOFError, pickle.PickleError) as e:
+                logger.error(f"旁路监控进程通信失败: {e}")
+                return None
+
+            if isinstance(reply, dict) and reply.get("error"):
+                logger.error(f"旁路监控进程执行 {command} 失败: {reply['error']}")
+                return None
+
+            return reply
+
+    def render(self, **kwargs) -> bytes:
+        """
+        在子进程中绘制图表，参数同 chart
+        """
+        reply = self.request("render", kwargs=kwargs)
+        if reply is None:
+            raise RuntimeError("旁路监控进程绘制图表失败")
+
+        return reply["image"]
+
+    def collect(self) -> dict:
+        """
+        停止采集并取回报告数据，只请求一次
+        """
+        if self.report is None:
+            self.report = self.request("collect") or {"tables": [], "charts": [], "events": []}
+
+        return self.report
+
+    def close(self):
+        if self.process.poll() is None:
+            with self.lock:
+                self.process.stdin.close()
+            self.process.wait(timeout=10)
+
+    def usage_summary(self, start: float = None, end: float = None) -> list:
+        reply = self.request("usage_summary", start=start, end=end)
+        return reply["lines"] if reply else []
+
+    @property
+    def cpu_percent(self) -> Optional[float]:
+        reply = self.request("cpu_percent")
+        return reply["value"] if reply else None
+
+    @property
+    def namespace_resource(self) -> dict:
+        return self.collect()["tables"][0]
+
+    @property
+    def service_resource(self) -> dict:
+        return self.collect()["tables"][1]
+
+    @property
+    def pod_resource(self) -> dict:
+        return self.collect()["tables"][2]
+
+    @property
+    def events(self) -> list:
+        return self.collect()["events"]
+
+    @property
+    def service_usage_charts(self) -> list:
+        # 图片内容还原为邮件图片对象，html 格式下为图表数据，直接使用
+        return [(name, cid, MIMEImage(image) if isinstance(image, bytes) else image)
+                for name, cid, image in self.collect()["charts"]]
+
+
+def serve():
+    """
+    子进程主循环
+    """
+    from gevent.fileobject import FileObjectPosix
+    from honeypot.libs.monitor import KubernetesMonitor
+    from honeypot.libs.render import Canvas, chart
+    from honeypot.core.corntab import ScheduleJob
+
+    # 标准输出留给通信，日志等输出改到标准错误。读写都用协程友好的文件对象，等待命令时不阻塞采集任务
+    channel = FileObjectPosix(os.dup(1), "wb")
+    os.dup2(2, 1)
+    commands = FileObjectPosix(0, "rb")
+
+    k8s = None
+    while True:
+        message = receive(commands)
+        if message is None:
+            break
+
+        command = message["command"]
+        try:
+            if command == "init":
+                Canvas.format = message["report_format"]
+                k8s = KubernetesMonitor(message["namespace"], message["config_yaml"], message["label_selector"],
+                                        message["field_selector"])
+                ScheduleJob.run()
+                reply = {"status": k8s.status}
+
+            elif command == "cpu_percent":
+                reply = {"value": k8s.cpu_percent if k8s.status else None}
+
+            elif command == "usage_summary":
+                reply = {"lines": k8s.usage_summary(message["start"], message["end"]) if k8s.status else []}
+
+            elif command == "render":
+                reply = {"image": chart(**message["kwargs"])}
+
+            elif command == "collect":
+                ScheduleJob.stop()
+                tables, charts, events = [], [], []
+                if k8s.status:
+                    tables = [k8s.namespace_resource, k8s.service_resource, k8s.pod_resource]
+                    charts = [(name, cid, image if isinstance(image, dict) else image.get_payload(decode=True))
+                              for name, cid, image in k8s.service_usage_charts]
+                    events = k8s.events
+                reply = {"tables": tables, "charts": charts, "events": events}
+
+            else:
+                reply = {"error": f"未知命令 {command}"}
+
+        except Exception as e:
+            reply = {"error": str(e)}
+
+        send(channel, reply)
+
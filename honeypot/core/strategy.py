@@ -1,9 +1,18 @@
+import os
+import math
 import time
+import statistics
 
-from typing import Optional, Tuple
+from collections import deque
+from typing import Optional, Tuple, Union
 from locust import LoadTestShape
+from locust.runners import MasterRunner, WORKER_REPORT_INTERVAL
 
+from honeypot import CONFIG_DIR
 from honeypot.core.corntab import ScheduleJob
+from honeypot.core.dispatch import Dispatcher
+from honeypot.libs.cio import load_json, load_yaml
+from honeypot.libs.render import draw
 from honeypot.libs.utils import logger
 
 
@@ -16,6 +25,11 @@ class DefaultStrategy(LoadTestShape):
             duration: 当前策略的测试周期
             users: 并发数
             spawn_rate: 执行策略时，每秒钟启动多少用户
+            rate: 可选，到达率模式下当前策略的目标RPS，此时 users 表示初始的虚拟用户池大小
+            measured: 可选，当前策略是否计入聚合报告，默认有用户在测试就计入
+            table: 可选，逐秒的负载表，由策略文件的负载曲线预先编译得到
+            control: 可选，为 True 时负载由闭环控制器逐秒调节
+            warmup/steady_min/steady_extend/steady_early: 可选，覆盖命令行的稳态检测配置
 
         environment: 测试环境对象
     同时需要你在locust所有前置工作完成后，主动告知策略开始执行。即设置 environment.shape_class.start = True
@@ -32,6 +46,9 @@ class DefaultStrategy(LoadTestShape):
         self.strategies = None
         self.strategy_num = 0
 
+        # 动态策略规划器。为空时按预先解析好的策略列表执行
+        self.planner = None
+
         # 当前测试的 environment对象 和 c_runner 实例
         self.env = None
         self.c_runner = None
@@ -39,6 +56,24 @@ class DefaultStrategy(LoadTestShape):
         # 默认从第0组策略开始执行
         self.point = 0
 
+        # 到达率模式下的虚拟用户池大小，只增不减
+        self.pool = 0
+
+        # 当前下发给调度器的到达率、暂停状态、阶段序号及平摊的 worker 数量
+        self.rate = 0
+        self.paused = False
+        self.stage = -1
+        self.workers = 0
+
+        # 当前的用户数
+        self.users = 0
+
+        # 缓冲阶段保持用户存活
+        self.keep_alive = False
+
+        # 稳态检测
+        self.steady = None
+
         # 测试启动/结束总时间
         # 为方便使用，这里保存13位毫秒级整数时间戳
         self.begin = round(time.time() * 1000)
@@ -48,17 +83,25 @@ class DefaultStrategy(LoadTestShape):
         """
         配置各种信息
         """
-        self.strategies = StrategySupport.parse_strategy(environment.parsed_options)
+        self.planner = StrategySupport.parse_planner(environment.parsed_options)
+        if self.planner:
+            self.strategies = self.planner.next()
+        elif getattr(environment.parsed_options, "strategy_file", None):
+            self.strategies = StrategySupport.parse_file(environment.parsed_options)
+        else:
+            self.strategies = StrategySupport.parse_strategy(environment.parsed_options)
         self.strategy_num = len(self.strategies)
 
         self.env = environment
+        self.steady = SteadyState(environment.parsed_options)
+        self.keep_alive = getattr(environment.parsed_options, "keep_alive", False)
 
         # 初始化操作
         environment.c_runner.set_up()
 
         # 启动出发策略执行
         self.reset_time()
-        self.env.stats.reset_all()
+        self.reset_stats()
 
         # 调度任务开始执行
         self.start = True
@@ -75,28 +118,514 @@ class DefaultStrategy(LoadTestShape):
             self.finish = round(time.time() * 1000)
             return None
 
+        # 预热期结束后重置统计数据，使阶段的聚合结果只包含稳态数据
+        if StrategySupport.measured(self.strategies[self.point]) and "trimmed" not in self.strategies[self.point]:
+            if self.steady.check(self.strategies[self.point], self.get_run_time(), self.env.stats.total):
+                self.strategies[self.point]["trimmed"] = round(self.get_run_time())
+                self.reset_stats()
+                logger.info(f"📐 steady state reached, {self.strategies[self.point]['trimmed']}s warm-up trimmed")
+
         # 根据测试时间来判断当前策略是否执行完成
-        if self.get_run_time() >= self.strategies[self.point]["duration"]:
+        if self.steady.finished(self.strategies[self.point], self.get_run_time(), self.env.stats.total):
             # 只要当前阶段由用户在测试就统计一次
-            if self.strategies[self.point]["users"] != 0:
+            if StrategySupport.measured(self.strategies[self.point]):
+                if self.planner:
+                    self.planner.judge(self.strategies[self.point], self.env.stats.total)
+
                 logger.info("Aggregating current concurrency test results...")
                 self.env.c_runner.aggregate()
 
+            # 动态策略在最后一个阶段结束时规划后续阶段
+            if self.planner and self.point == self.strategy_num - 1:
+                self.strategies.extend(self.planner.next())
+                self.strategy_num = len(self.strategies)
+
             if self.point < self.strategy_num - 1:
                 self.point += 1
                 self.reset_time()
-                self.env.stats.reset_all()
+                self.reset_stats()
+                self.steady.reset()
             else:
                 self.finish = round(time.time() * 1000)
                 logger.info("🎉 end of testing")
                 return None
 
-            if self.strategies[self.point]["users"]:
+            if self.strategies[self.point].get("rate"):
+                logger.info(f"🚀 {self.strategies[self.point]['rate']} requests/s are testing")
+            elif self.strategies[self.point]["users"]:
                 logger.info(f"🚀 {self.strategies[self.point]['users']} users are testing")
             else:
                 logger.info(f"☕️ take a rest")
 
-        return self.strategies[self.point]["users"], self.strategies[self.point]["spawn_rate"]
+        stage = self.strategies[self.point]
+
+        # 负载曲线阶段按运行秒数查表，闭环控制阶段由控制器计算
+        load = None
+        if "table" in stage:
+            load = stage["table"][min(int(self.get_run_time()), len(stage["table"]) - 1)]
+        elif stage.get("control"):
+            load = self.planner.adjust(self.get_run_time(), self.env)
+
+        if "rate" in stage:
+            rate = stage["rate"] if load is None else load
+            users = self.arrival_users(rate)
+        else:
+            rate = 0
+            users = stage["users"] if load is None else load
+
+        # 缓冲阶段保持用户存活及连接，仅暂停请求，下个阶段在此基础上增减用户
+        paused = self.keep_alive and users == 0 and self.users > 0
+        if paused:
+            users = self.users
+
+        # worker 加入或退出时重新平摊，新加入的 worker 同时得到当前的调度状态
+        if rate != self.rate or paused != self.paused or self.point != self.stage or \
+                self.worker_count() != self.workers:
+            self.dispatch(rate, paused)
+
+        self.users = users
+        return users, stage["spawn_rate"]
+
+    def reset_stats(self):
+        """
+        重置统计数据，包括 locust 统计、响应时间直方图、各目标的统计及施压机峰值
+        """
+        self.env.stats.reset_all()
+        self.env.c_runner.recorder.reset()
+        self.env.c_runner.variants.reset()
+        self.env.c_runner.generator.reset()
+
+    @property
+    def summary(self) -> list:
+        """
+        策略相关的报告表格
+        """
+        if self.planner:
+            return self.planner.summary
+
+        return []
+
+    @property
+    def charts(self) -> list:
+        """
+        策略相关的报告图表
+        """
+        if self.planner:
+            return self.planner.charts
+
+        return []
+
+    @property
+    def current(self) -> dict:
+        """
+        当前正在执行的策略
+        """
+        return self.strategies[min(self.point, self.strategy_num - 1)]
+
+    def worker_count(self) -> int:
+        """
+        分布式模式下已连接的 worker 数量(包括就绪、启动中及运行中)，单机模式为 0
+        """
+        return self.env.runner.worker_count if isinstance(self.env.runner, MasterRunner) else 0
+
+    def dispatch(self, rate: float, paused: bool):
+        """
+        将目标到达率、暂停状态及阶段序号下发给调度器
+        分布式模式下按 worker 数量平摊到达率，并通过自定义消息同步给各 worker
+        """
+        self.rate = rate
+        self.paused = paused
+        self.stage = self.point
+        self.workers = self.worker_count()
+        arrival = getattr(self.env.parsed_options, "arrival", "fixed")
+
+        if isinstance(self.env.runner, MasterRunner):
+            self.env.runner.send_message("dispatch", {"rate": rate / max(self.workers, 1), "arrival": arrival,
+                                                      "paused": paused, "stage": self.stage})
+        else:
+            Dispatcher.update(rate, arrival, paused, self.stage)
+
+    def arrival_users(self, rate: float) -> int:
+        """
+        到达率模式下计算虚拟用户池大小
+        根据 Little 定律，维持目标到达率所需的并发数 ≈ 到达率 × 响应时间，用户池只增不减
+        """
+        if not rate:
+            return 0
+
+        rt = (self.env.stats.total.get_current_response_time_percentile(0.95) or 0) / 1000
+        need = math.ceil(rate * rt * 1.2) + 1
+        max_users = getattr(self.env.parsed_options, "max_users", 1000)
+
+        self.pool = min(max(self.pool, self.current["users"], need), max_users)
+        return self.pool
+
+
+class SteadyState:
+    """
+    稳态检测
+    预热期可以是固定秒数，也可以是 auto：以滑动窗口内 RPS 与响应时间的变异系数(CV)判断阶段是否进入稳态。
+    进入稳态的时刻之前的数据作为预热剔除；阶段可在稳态持续足够时间后提前结束，
+    也可在计入时长不足时延长，直到满足或达到延长上限
+    """
+
+    def __init__(self, options):
+        self.warmup = str(getattr(options, "warmup", "0"))
+        self.cv = getattr(options, "steady_cv", 0.1)
+        self.window = max(getattr(options, "steady_window", 10), 2)
+        self.min = getattr(options, "steady_min", 0)
+        self.extend = getattr(options, "steady_extend", 0)
+        self.early = getattr(options, "steady_early", False)
+
+        # 滑动窗口内的 RPS 和响应时间
+        self.rps = deque(maxlen=self.window)
+        self.rt = deque(maxlen=self.window)
+
+    def reset(self):
+        self.rps.clear()
+        self.rt.clear()
+
+    @staticmethod
+    def variation(values) -> float:
+        """
+        变异系数
+        """
+        mean = statistics.mean(values)
+        if not mean:
+            return math.inf
+
+        return statistics.pstdev(values) / mean
+
+    def no_warmup(self, stage: dict) -> bool:
+        """
+        阶段是否未设置预热
+        """
+        warmup = str(stage.get("warmup", self.warmup))
+        return warmup != "auto" and float(warmup) <= 0
+
+    def check(self, stage: dict, run_time: float, total) -> bool:
+        """
+        判断阶段是否已度过预热期
+        """
+        warmup = str(stage.get("warmup", self.warmup))
+
+        if warmup != "auto":
+            return float(warmup) > 0 and run_time >= float(warmup)
+
+        self.rps.append(total.current_rps)
+        self.rt.append(total.get_current_response_time_percentile(0.5) or 0)
+
+        if len(self.rps) < self.window:
+            return False
+
+        return self.variation(self.rps) <= self.cv and self.variation(self.rt) <= self.cv
+
+    def finished(self, stage: dict, run_time: float, total) -> bool:
+        """
+        判断阶段是否结束
+        计入窗口需要有请求数据；剔除预热后至少经过一个 worker 上报周期，避免在重置统计的同一时刻结束阶段
+        """
+        steady_min = stage.get("steady_min", self.min)
+        if "trimmed" in stage:
+            counted = run_time - stage["trimmed"]
+        else:
+            # 未设置预热时整个阶段都计入；设置了预热但尚未剔除时还没有计入时长
+            counted = run_time if self.no_warmup(stage) else 0
+        enough = total.num_requests > 0 and counted >= steady_min and \
+            ("trimmed" not in stage or counted >= WORKER_REPORT_INTERVAL)
+
+        # 稳态持续足够时间后提前结束
+        if stage.get("steady_early", self.early) and "trimmed" in stage and enough:
+            return True
+
+        if run_time < stage["duration"]:
+            return False
+
+        # 计入时长不足时延长阶段
+        return enough or run_time >= stage["duration"] + stage.get("steady_extend", self.extend)
+
+
+class CapacitySearch:
+    """
+    容量探测
+    以 SLO 为判定标准逐轮探测负载：先指数增长找到首个不满足 SLO 的负载，
+    再在 [最高通过负载, 最低失败负载] 区间内二分，直到区间宽度不大于步进
+    """
+
+    def __init__(self, start, end, step, duration, options):
+        # 探测维度。users 并发数；rate 到达率
+        self.by = getattr(options, "search_by", "users")
+        self.mode = getattr(options, "strategy_mode", 0)
+
+        # SLO：指定分位响应时间(ms)和失败率(%)均低于阈值
+        self.percentile = getattr(options, "slo_percentile", 0.99)
+        self.rt = getattr(options, "slo_rt", 500)
+        self.fail = getattr(options, "slo_fail", 1.0)
+
+        # 到达率探测时实际达成的 RPS 需不低于目标的百分比，否则该负载未被真正承载
+        self.achieved = getattr(options, "slo_rate", 95.0)
+
+        self.start = max(start, 1)
+        self.end = max(end, self.start)
+        self.step = max(step, 1)
+        self.duration = duration
+
+        # 最高通过负载 / 最低失败负载
+        self.low = None
+        self.high = None
+
+        # 下一轮探测的负载，为 None 时探测结束
+        self.load = self.start
+        self.finished = False
+
+        # 探测记录 (负载, 分位响应时间, 失败率, 是否通过)
+        self.probes = []
+
+    def probe(self, load) -> dict:
+        """
+        构建一轮探测的策略
+        """
+        if self.by == "rate":
+            users = max(load // 10, 1)
+            return {"duration": self.duration, "users": users, "spawn_rate": users, "rate": load}
+
+        return StrategySupport.strategy_build(self.duration, load, max(load // 10, 1))
+
+    def rest(self, duration) -> dict:
+        """
+        构建缓冲阶段的策略
+        """
+        rest = StrategySupport.strategy_build(duration, 0, max(self.load or self.end, 1))
+        if self.by == "rate":
+            rest["rate"] = 0
+
+        return rest
+
+    def judge(self, stage: dict, total):
+        """
+        根据当前阶段的统计数据判定是否满足 SLO，结果记录到策略的 passed 字段
+        """
+        load = stage.get("rate", stage["users"])
+        rt = total.get_response_time_percentile(self.percentile) or 0
+        fail = round(total.fail_ratio * 100, 2)
+
+        passed = total.num_requests > 0 and rt < self.rt and fail < self.fail
+
+        # 并发上限或调度积压丢弃导致未达到目标到达率时判定为未通过
+        achieved = ""
+        if self.by == "rate" and load:
+            ratio = round(total.total_rps / load * 100, 1)
+            passed = passed and ratio >= self.achieved
+            achieved = f" rps={ratio}%"
+
+        stage["passed"] = passed
+        self.probes.append((load, rt, fail, passed))
+
+        if passed:
+            self.low = load
+        else:
+            self.high = load
+
+        # 计算下一轮探测的负载
+        if self.high is None:
+            self.load = min(load * 2, self.end) if load < self.end else None
+        else:
+            low = self.low or 0
+            self.load = (low + self.high) // 2 if self.high - low > self.step else None
+
+        logger.info(f"🔍 probe {load} {'passed' if passed else 'failed'}: "
+                    f"p{self.percentile * 100:g}={rt}ms fail={fail}%{achieved}")
+
+    def next(self) -> list:
+        """
+        规划后续阶段
+        """
+        if self.finished:
+            return []
+
+        stages = []
+        if self.load is None:
+            self.finished = True
+            if self.mode != 2:
+                stages.append(self.rest(min(self.duration // 5, 30)))
+        elif not self.probes:
+            if self.mode != 2:
+                stages.append(self.rest(min(self.duration // 5, 30)))
+            stages.append(self.probe(self.load))
+        else:
+            if self.mode == 0:
+                stages.append(self.rest(min(self.duration // 6, 300)))
+            stages.append(self.probe(self.load))
+
+        return stages
+
+    @property
+    def summary(self) -> list:
+        """
+        容量探测结果表格
+        """
+        slo = f"p{self.percentile * 100:g} < {self.rt}ms, fail% < {self.fail}"
+        if self.by == "rate":
+            slo += f", 达成率 >= {self.achieved}%"
+
+        if self.low is None:
+            capacity = "-"
+        elif self.high is None:
+            capacity = f">={self.low}"
+        else:
+            capacity = self.low
+
+        line = [self.by, slo, capacity, self.low if self.low is not None else 0,
+                self.high if self.high is not None else "-", len(self.probes)]
+
+        return [{"title": "容量探测", "heads": ["探测维度", "SLO", "最大可持续负载", "置信下界", "置信上界", "探测次数"],
+                 "lines": [line]}]
+
+    @property
+    def charts(self) -> list:
+        return []
+
+
+class LoadController:
+    """
+    闭环控制
+    以 PID 控制器持续调节并发数或到达率，使指定分位的响应时间(或 k8s 微服务 CPU 使用率)稳定在目标值，
+    测得"在目标值下可持续承载的负载"
+    """
+
+    def __init__(self, start, end, step, duration, options):
+        # 控制维度。users 并发数；rate 到达率
+        self.by = getattr(options, "control_by", "users")
+        self.mode = getattr(options, "strategy_mode", 0)
+
+        # 控制目标。rt 指定分位的响应时间(ms)；cpu 微服务CPU使用量占limits的百分比
+        self.target = getattr(options, "control_target", "rt")
+        self.setpoint = getattr(options, "target_cpu", 70) if self.target == "cpu" else getattr(options, "target_rt", 200)
+        self.percentile = getattr(options, "target_percentile", 0.95)
+        self.interval = max(getattr(options, "control_interval", 5), 1)
+        self.kp, self.ki, self.kd = [float(_) for _ in getattr(options, "pid", "1_0.2_0.1").split("_")]
+
+        self.load = max(start, 1)
+        self.end = max(end, self.load)
+        self.step = max(step, 1)
+        self.duration = duration
+
+        # 积分项、上一次误差、上一次调节时间
+        self.integral = 0.0
+        self.error = None
+        self.last = 0
+
+        self.planned = False
+        self.finished = False
+
+        # 控制轨迹 (时间戳, 负载, 观测值, 误差, 调节量)
+        self.trace = []
+
+    def measure(self, environment) -> Optional[float]:
+        """
+        读取当前的观测值
+        """
+        if self.target == "cpu":
+            return environment.c_runner.k8s.cpu_percent if environment.c_runner.k8s.status else None
+
+        return environment.stats.total.get_current_response_time_percentile(self.percentile)
+
+    def adjust(self, run_time: float, environment) -> Union[int, float]:
+        """
+        每个控制周期根据观测值调节一次负载
+        """
+        if run_time - self.last < self.interval:
+            return self.load
+
+        self.last = run_time
+        measured = self.measure(environment)
+        if measured is None:
+            return self.load
+
+        # 归一化误差，观测值低于目标时为正，需要加压
+        error = (self.setpoint - measured) / self.setpoint
+        self.integral = min(max(self.integral + error, -5), 5)
+        derivative = 0 if self.error is None else error - self.error
+        self.error = error
+
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        delta = round(min(max(output * self.step, -self.step), self.step))
+        self.load = min(max(self.load + delta, 1), self.end)
+
+        self.trace.append((round(time.time(), 2), self.load, measured, round(error, 3), delta))
+        return self.load
+
+    def rest(self, duration) -> dict:
+        """
+        构建缓冲阶段的策略
+        """
+        rest = StrategySupport.strategy_build(duration, 0, max(self.load, 1))
+        if self.by == "rate":
+            rest["rate"] = 0
+
+        return rest
+
+    def judge(self, stage: dict, total):
+        pass
+
+    def next(self) -> list:
+        """
+        规划后续阶段：控制阶段执行完毕后追加结束缓冲
+        """
+        if self.finished:
+            return []
+
+        stages = []
+        if self.mode != 2:
+            stages.append(self.rest(min(self.duration // 5, 30)))
+
+        if self.planned:
+            self.finished = True
+        else:
+            control = StrategySupport.strategy_build(self.duration, self.load, max(self.end // 10, 1))
+            control["control"] = True
+            if self.by == "rate":
+                control["users"] = max(self.load // 10, 1)
+                control["rate"] = self.load
+
+            stages.append(control)
+            self.planned = True
+
+        return stages
+
+    @property
+    def summary(self) -> list:
+        """
+        闭环控制结果表格，以最后 1/3 控制周期的均值作为稳定负载
+        """
+        unit = "%" if self.target == "cpu" else "ms"
+        target = f"{'cpu' if self.target == 'cpu' else 'p' + format(self.percentile * 100, 'g')} = {self.setpoint}{unit}"
+
+        tail = self.trace[-max(len(self.trace) // 3, 1):]
+        load = round(sum(_[1] for _ in tail) / len(tail), 1) if tail else "-"
+        measured = round(sum(_[2] for _ in tail) / len(tail), 1) if tail else "-"
+
+        line = [self.by, target, f"{self.kp}/{self.ki}/{self.kd}", len(self.trace), load, f"{measured}{unit}"]
+        return [{"title": "闭环控制", "heads": ["控制维度", "控制目标", "Kp/Ki/Kd", "控制次数", "稳定负载", "稳定观测值"],
+                 "lines": [line]}]
+
+    @property
+    def charts(self) -> list:
+        """
+        控制轨迹图表
+        """
+        if len(self.trace) < 2:
+            return []
+
+        x_axis = [_[0] for _ in self.trace]
+        load_chart = draw("Controller Load", x_axis=x_axis, y_axis=[(self.by, [_[1] for _ in self.trace])],
+                          title="Controller Load", y_label=self.by)
+        measured_chart = draw("Controller Measurement", x_axis=x_axis,
+                              y_axis=[(self.target, [_[2] for _ in self.trace]),
+                                      ("target", [self.setpoint] * len(self.trace))],
+                              title="Controller Measurement", y_label="%" if self.target == "cpu" else "ms")
+
+        return [load_chart, measured_chart]
 
 
 class StrategySupport:
@@ -115,6 +644,111 @@ class StrategySupport:
             "spawn_rate": spawn_rate
         }
 
+    @staticmethod
+    def measured(strategy: dict) -> bool:
+        """
+        策略是否计入聚合报告
+        """
+        return strategy.get("measured", strategy["users"] != 0)
+
+    @staticmethod
+    def compile_curve(stage: dict) -> list:
+        """
+        将负载曲线编译为逐秒的负载表
+        hold: 恒定负载 load
+        ramp: 从 from 线性变化到 to
+        step: 从 from 到 to 分 steps 级阶梯变化
+        spike: 基础负载 base，在第 at 秒起的 width 秒内突增至 peak
+        sine: 以 base 为中心、amplitude 为振幅、period 秒为周期的正弦波
+        """
+        duration = max(int(stage["duration"]), 1)
+        curve = stage.get("curve", "hold")
+        table = []
+
+        for t in range(duration):
+            if curve == "hold":
+                load = stage["load"]
+            elif curve == "ramp":
+                load = stage["from"] + (stage["to"] - stage["from"]) * t / max(duration - 1, 1)
+            elif curve == "step":
+                steps = max(int(stage.get("steps", 1)), 1)
+                level = t * steps // duration
+                load = stage["from"] + (stage["to"] - stage["from"]) * level / (steps - 1) if steps > 1 else stage["to"]
+            elif curve == "spike":
+                at = stage.get("at", 0)
+                load = stage["peak"] if at <= t < at + stage.get("width", 1) else stage["base"]
+            elif curve == "sine":
+                load = stage["base"] + stage["amplitude"] * math.sin(2 * math.pi * t / stage["period"])
+            else:
+                raise RuntimeError(f"Strategy curve {curve} is illegal !!!")
+
+            table.append(max(round(load), 0))
+
+        return table
+
+    @classmethod
+    def parse_file(cls, options) -> list:
+        """
+        解析 config 目录下的策略文件(yaml/json)，每个阶段的负载曲线在此一次性编译为逐秒负载表
+        文件格式参考 scripts/config/demo_strategy.yaml
+        """
+        path = os.path.join(CONFIG_DIR, options.strategy_file)
+        if not os.path.exists(path):
+            raise RuntimeError(f"策略文件不存在  {path}")
+
+        data = load_json(path) if path.endswith(".json") else load_yaml(path)
+        strategy_type = data.get("type", "users")
+        strategies = []
+
+        for item in data.get("stages", []):
+            table = cls.compile_curve(item)
+            peak = max(table)
+
+            strategy = cls.strategy_build(len(table), peak, item.get("spawn_rate", max(peak // 10, 1)))
+            strategy["measured"] = item.get("measured", peak != 0)
+            strategy["table"] = table
+
+            for key in ("warmup", "steady_min", "steady_extend", "steady_early"):
+                if key in item:
+                    strategy[key] = item[key]
+
+            # 到达率曲线：users 作为初始的虚拟用户池大小，rate 记录阶段的平均目标RPS
+            if strategy_type == "rate":
+                strategy["users"] = max(peak // 10, 1) if peak else 0
+                strategy["rate"] = round(sum(table) / len(table), 2)
+
+            strategies.append(strategy)
+
+        if not strategies:
+            raise RuntimeError("Strategy file has no stages !!!")
+
+        logger.info(f"📚 strategies information: {[{k: v for k, v in s.items() if k != 'table'} for s in strategies]}")
+        return strategies
+
+    @classmethod
+    def parse_planner(cls, options) -> Optional[Union[CapacitySearch, LoadController]]:
+        """
+        根据入参，返回动态策略规划器
+        容量探测时策略规则: 起始负载_最大负载_探测精度_每轮探测时间
+        闭环控制时策略规则: 起始负载_最大负载_单次最大调节量_控制总时长
+        """
+        strategy_type = getattr(options, "strategy_type", "users")
+        if strategy_type not in ("search", "control"):
+            return None
+
+        strategy = getattr(options, "strategy", 0)
+        if not strategy:
+            raise RuntimeError("Argument strategy is required !!!")
+
+        args = [int(_) for _ in strategy.split("_")]
+        if len(args) != 4:
+            raise RuntimeError("Argument strategy is illegal !!!")
+
+        if strategy_type == "control":
+            return LoadController(*args, options)
+
+        return CapacitySearch(*args, options)
+
     @classmethod
     def parse_strategy(cls, options) -> list:
         """
@@ -125,6 +759,7 @@ class StrategySupport:
         """
         strategy = getattr(options, "strategy", 0)
         mode = getattr(options, "strategy_mode")
+        strategy_type = getattr(options, "strategy_type", "users")
         strategies = []
 
         if not strategy:
@@ -181,5 +816,12 @@ class StrategySupport:
                     temp.append(cls.strategy_build(min(duration // 6, 300), 0, strategies[i]["spawn_rate"]))
             strategies = temp
 
+        # 到达率模式：策略中的并发数即为目标RPS，users 作为初始的虚拟用户池大小
+        if strategy_type == "rate":
+            for item in strategies:
+                item["rate"] = item["users"]
+                item["users"] = max(item["rate"] // 10, 1) if item["rate"] else 0
+                item["spawn_rate"] = max(item["users"], 1)
+
         logger.info(f"📚 strategies information: {strategies}")
         return strategies
@@ -1,5 +1,7 @@
 from locust import FastHttpUser, task
 
+from honeypot.core.dispatch import Dispatcher
+
 
 class TestUser(FastHttpUser):
     """
@@ -8,8 +10,20 @@ class TestUser(FastHttpUser):
 
     def __init__(self, environment):
         self.host = environment.c_runner.host
+
+        # 多目标对比时按比例分配目标地址
+        self.variant = None
+        if environment.c_runner.variants.enabled:
+            environment.c_runner.variants.bind(self)
+
         super().__init__(environment)
 
     @task
     def task(self):
+        # 到达率模式下等待调度器分配的发送时刻
+        Dispatcher.acquire()
+
+        if self.environment.c_runner.variants.enabled:
+            self.environment.c_runner.variants.switch(self)
+
         self.environment.c_runner.call(self)
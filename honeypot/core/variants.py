@@ -0,0 +1,183 @@
+import math
+
+from gevent.local import local
+from locust.env import Environment
+from locust.runners import WorkerRunner
+
+from honeypot.libs.histogram import Histogram
+from honeypot.core.history import Regression
+
+
+class Variants:
+    """
+    A/B(多目标)交替施压
+    同一次测试中按比例把流量分配到多个目标地址，各目标处于相同的环境和时间段，对比结果不受环境漂移影响。
+        user     每个虚拟用户创建时分配目标，之后固定访问该目标
+        request  每个请求发送前重新分配目标
+    分配使用平滑加权轮询，任意时刻各目标的分配数量都接近设定比例。
+
+    各目标的请求单独记录直方图及请求数，worker 节点随统计报告上报，每个阶段结束时冻结为快照。
+    报告中对比各目标与第一个目标(对照组)：响应时间用双侧 Mann-Whitney U 检验；
+    吞吐量用请求数占比相对设定比例的 z 检验，仅在 user 模式下有意义(request 模式下请求数由分配比例决定)
+    """
+
+    def __init__(self, environment: Environment, hosts: dict):
+        self.env = environment
+        options = environment.parsed_options
+        self.digits = getattr(options, "hdr_digits", 2)
+
+        # 目标名字 -> 地址，支持 名字=地址 的写法，否则按 A、B、C... 命名
+        self.hosts = {}
+        for idx, host in enumerate(getattr(options, "hosts", None) or []):
+            name, _, url = host.partition("=") if "=" in host.split("://")[0] else ("", "", host)
+            self.hosts[name or chr(ord("A") + idx)] = url
+        if not self.hosts:
+            self.hosts = dict(hosts)
+
+        self.names = list(self.hosts)
+        self.split = getattr(options, "variant_split", "user")
+
+        ratio = str(getattr(options, "variant_ratio", None) or "")
+        weights = [float(x) for x in ratio.split("_") if x] or [1.0] * len(self.names)
+        if len(self.names) > 1 and (len(weights) != len(self.names) or any(w < 0 for w in weights) or not sum(weights)):
+            raise RuntimeError(f"variant_ratio 与目标数量不匹配  {ratio}")
+        self.weights = dict(zip(self.names, weights))
+
+        # 平滑加权轮询的当前权重
+        self.current = {name: 0.0 for name in self.names}
+
+        # 当前协程正在发送的请求所属的目标
+        self.local = local()
+
+        # 当前阶段各目标的统计 {目标: {"histogram": Histogram, "requests": 请求数, "failures": 失败数}}
+        self.stats = self.empty()
+        self.snapshots = []
+
+        if self.enabled:
+            environment.events.request.add_listener(self.on_request)
+            if isinstance(environment.runner, WorkerRunner):
+                environment.events.report_to_master.add_listener(self.on_report_to_master)
+            else:
+                environment.events.worker_report.add_listener(self.on_worker_report)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.names) > 1
+
+    def empty(self) -> dict:
+        return {name: {"histogram": Histogram(self.digits), "requests": 0, "failures": 0} for name in self.names}
+
+    def pick(self) -> str:
+        """
+        平滑加权轮询选择目标
+        """
+        total = sum(self.weights.values())
+        for name in self.names:
+            self.current[name] += self.weights[name]
+
+        name = max(self.names, key=lambda x: self.current[x])
+        self.current[name] -= total
+
+        return name
+
+    def bind(self, user):
+        """
+        虚拟用户创建时设置目标
+        """
+        user.variant = self.pick()
+        user.host = self.hosts[user.variant]
+
+    def switch(self, user):
+        """
+        请求发送前确定本次请求的目标，request 模式下重新分配
+        """
+        if self.split == "request":
+            user.variant = self.pick()
+            user.host = self.hosts[user.variant]
+            user.client.base_url = user.host
+
+        self.local.variant = user.variant
+
+    def on_request(self, response_time, exception=None, **kwargs):
+        variant = getattr(self.local, "variant", None)
+        if variant is None or response_time is None:
+            return
+
+        stats = self.stats[variant]
+        stats["histogram"].record(response_time)
+        stats["requests"] += 1
+        if exception:
+            stats["failures"] += 1
+
+    def on_report_to_master(self, client_id, data: dict):
+        data["variants"] = {name: [stats["histogram"].serialize(), stats["requests"], stats["failures"]]
+                            for name, stats in self.stats.items()}
+        self.stats = self.empty()
+
+    def on_worker_report(self, client_id, data: dict):
+        for name, (histogram, requests, failures) in data.get("variants", {}).items():
+            stats = self.stats[name]
+            stats["histogram"].merge(Histogram.deserialize(histogram))
+            stats["requests"] += requests
+            stats["failures"] += failures
+
+    def reset(self):
+        """
+        丢弃当前阶段的统计，预热剔除及阶段切换时与 locust 统计一起重置
+        """
+        self.stats = self.empty()
+
+    def snapshot(self, duration: float) -> dict:
+        """
+        冻结当前阶段各目标的统计
+        :param duration: 阶段时长(s)，用于计算 QPS
+        """
+        snapshot = {"duration": max(duration, 1), "stats": self.stats}
+        self.snapshots.append(snapshot)
+        self.stats = self.empty()
+
+        return snapshot
+
+    def throughput_p(self, name: str, control: str, stats: dict) -> float:
+        """
+        两个目标请求数之比相对设定比例的双侧 z 检验
+        """
+        a, b = stats[name]["requests"], stats[control]["requests"]
+        n = a + b
+        share = self.weights[name] / (self.weights[name] + self.weights[control])
+        if not n or share in (0, 1):
+            return 1.0
+
+        z = (a - n * share) / math.sqrt(n * share * (1 - share))
+        return math.erfc(abs(z) / math.sqrt(2))
+
+    @property
+    def summary(self) -> list:
+        """
+        各阶段各目标的并列聚合表及差异显著性
+        """
+        control = self.names[0]
+        heads = ["阶段", "目标", "地址", "请求总数", "fails", "QPS", "平均响应", "50%ile", "90%ile", "99%ile", "fail%",
+                 "90%ile差异", "响应时间p值", "吞吐量p值"]
+        lines = []
+        for stage, snapshot in enumerate(self.snapshots, 1):
+            stats = snapshot["stats"]
+            base = stats[control]["histogram"]
+            for name in self.names:
+                histogram, requests, failures = stats[name]["histogram"], stats[name]["requests"], stats[name]["failures"]
+                line = [stage, name, self.hosts[name], requests, failures, round(requests / snapshot["duration"], 2),
+                        round(histogram.mean or 0, 1), histogram.percentile(0.5), histogram.percentile(0.9),
+                        histogram.percentile(0.99), round(failures / requests * 100, 2) if requests else 0]
+
+                if name == control:
+                    line.extend(["对照组", "-", "-"])
+                else:
+                    p_value = min(1.0, 2 * min(Regression.mann_whitney(histogram, base),
+                                               Regression.mann_whitney(base, histogram)))
+                    base_p90, p90 = base.percentile(0.9), histogram.percentile(0.9)
+                    change = f"{round((p90 - base_p90) / base_p90 * 100, 1)}%" if base_p90 and p90 is not None else "-"
+                    line.extend([change, f"{p_value:.2e}", f"{self.throughput_p(name, control, stats):.2e}"])
+
+                lines.append(line)
+
+        return [{"title": "A/B 对比", "heads": heads, "lines": lines}]
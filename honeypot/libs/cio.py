@@ -1,6 +1,8 @@
 import csv
 import json
 import yaml
+import pickle
+import struct
 import platform
 from typing import Generator
 
@@ -91,3 +93,24 @@ def dump_yaml(path, content, intent=2):
 
     with open(path, "w", encoding="utf8") as f:
         yaml.safe_dump(content, f, allow_unicode=True, sort_keys=False, indent=intent)
+
+
+def send(stream, data):
+    """
+    写入一帧：长度(uint32) + pickle 数据
+    """
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(struct.pack("<I", len(payload)) + payload)
+    stream.flush()
+
+
+def receive(stream):
+    """
+    读取一帧，对端关闭时返回 None
+    """
+    head = stream.read(4)
+    if len(head) < 4:
+        return None
+
+    (size,) = struct.unpack("<I", head)
+    return pickle.loads(stream.read(size))
@@ -0,0 +1,202 @@
+import time
+import numpy as np
+
+from typing import List, Tuple
+
+from honeypot.libs.utils import logger
+
+
+class EventTimeline:
+    """
+    k8s 事件时间线
+    订阅 pod、HPA 的 watch 事件，对比新旧对象得到带时间戳的事件:
+        restart   容器重启(非 OOM)
+        oom       容器因 OOMKilled 重启
+        ready     pod 变为就绪
+        unready   pod 变为未就绪
+        scale     HPA 期望副本数变化
+        created   测试过程中新建的 pod
+        deleted   测试过程中删除的 pod
+        throttle  pod CPU 使用量达到 limits，由资源采样计算
+    事件统一为 (时间戳, 类型, 对象, 详情)，用于在图表上标注，以及与响应时间的异常做关联
+    """
+
+    # 各类事件在图表上的颜色
+    colors = {
+        "restart": "#CC0000",
+        "oom": "#880000",
+        "ready": "#009900",
+        "unready": "#FF6600",
+        "scale": "#0055CC",
+        "created": "#0099CC",
+        "deleted": "#996633",
+        "throttle": "#AA00AA"
+    }
+
+    def __init__(self):
+        self.events = []
+
+    def add(self, timestamp: float, kind: str, target: str, detail: str = ""):
+        self.events.append((round(timestamp, 2), kind, target, detail))
+
+    @staticmethod
+    def timestamp(value) -> float:
+        """
+        k8s 对象中的时间(datetime)转换为时间戳，缺失时取当前时间
+        """
+        return value.timestamp() if value else time.time()
+
+    @staticmethod
+    def ready(pod) -> bool:
+        for condition in (pod.status and pod.status.conditions) or []:
+            if condition.type == "Ready":
+                return condition.status == "True"
+
+        return False
+
+    def on_pod(self, kind: str, old, new):
+        """
+        pod watch 事件处理
+        """
+        name = new.metadata.name
+        if kind == "ADDED" and old is None:
+            self.add(self.timestamp(new.metadata.creation_timestamp), "created", name)
+            return
+
+        if kind == "DELETED":
+            self.add(time.time(), "deleted", name)
+            return
+
+        if old is None:
+            return
+
+        # 容器重启，以上一次终止的时间为事件时间
+        restarts = {status.name: status.restart_count for status in (old.status.container_statuses or [])}
+        for status in new.status.container_statuses or []:
+            if status.restart_count <= restarts.get(status.name, status.restart_count):
+                continue
+
+            terminated = status.last_state and status.last_state.terminated
+            reason = (terminated and terminated.reason) or ""
+            self.add(self.timestamp(terminated and terminated.finished_at), "oom" if reason == "OOMKilled" else "restart",
+                     f"{name}/{status.name}", f"{reason} exit={terminated.exit_code}" if terminated else "")
+
+        # 就绪状态变化
+        before, after = self.ready(old), self.ready(new)
+        if before != after:
+            transition = [condition.last_transition_time for condition in new.status.conditions or []
+                          if condition.type == "Ready"]
+            self.add(self.timestamp(transition[0] if transition else None), "ready" if after else "unready", name)
+
+    def on_hpa(self, kind: str, old, new):
+        """
+        HPA watch 事件处理
+        """
+        if kind != "MODIFIED" or old is None:
+            return
+
+        before, after = old.status.desired_replicas, new.status.desired_replicas
+        if before != after:
+            self.add(self.timestamp(new.status.last_scale_time), "scale", new.metadata.name, f"{before} -> {after}")
+
+    @staticmethod
+    def edges(name: str, times, values, kind: str = None) -> List[tuple]:
+        """
+        序列值变化的时刻转换为事件，用于从指标序列(如 Prometheus)还原事件
+        :param kind: 事件类型，为 None 时按变化方向取 ready/unready(值为 1/0 的就绪序列)
+        """
+        events = []
+        for idx in range(1, len(values)):
+            before, after = values[idx - 1], values[idx]
+            if before == after or np.isnan(before) or np.isnan(after):
+                continue
+
+            if kind:
+                events.append((round(times[idx], 2), kind, name, f"{before:g} -> {after:g}"))
+            else:
+                events.append((round(times[idx], 2), "ready" if after > before else "unready", name, ""))
+
+        return events
+
+
+def anomalies(times, values, window: int = 15, threshold: float = 5.0) -> List[Tuple[float, float, float, float]]:
+    """
+    响应时间异常检测
+    以前 window 个采样点的中位数为基线、中位数绝对偏差(MAD)为波动幅度，超过 基线 + threshold 倍波动幅度
+    且超过基线 20% 的点为异常，连续的异常点合并为一段
+    :return: [(开始时间, 结束时间, 峰值, 基线), ...]
+    """
+    values = np.asarray(values, dtype=float)
+    times = np.asarray(times, dtype=float)
+    if len(values) <= window:
+        return []
+
+    history = np.lib.stride_tricks.sliding_window_view(values[:-1], window)
+    baseline = np.median(history, axis=1)
+    spread = np.median(np.abs(history - baseline[:, None]), axis=1) * 1.4826
+
+    # 波动幅度过小时以基线的 5% 为下限，避免平稳阶段的微小起伏被判定为异常
+    current = values[window:]
+    limit = baseline + threshold * np.maximum(spread, baseline * 0.05)
+    flags = (current > limit) & (current > baseline * 1.2)
+
+    episodes = []
+    idx = 0
+    while idx < len(flags):
+        if not flags[idx]:
+            idx += 1
+            continue
+
+        end = idx
+        while end + 1 < len(flags) and flags[end + 1]:
+            end += 1
+
+        peak = idx + int(np.argmax(current[idx:end + 1]))
+        episodes.append((float(times[window + idx]), float(times[window + end]), float(current[peak]),
+                         float(baseline[idx])))
+        idx = end + 1
+
+    return episodes
+
+
+def correlate(events: list, episodes: list, window: float) -> list:
+    """
+    事件与响应时间异常的关联报告
+    :param events: [(时间戳, 类型, 对象, 详情), ...]
+    :param episodes: anomalies 的结果
+    :param window: 关联的时间范围(s)，异常段前后 window 秒内的事件视为相关
+    :return: 事件时间线表格及关联异常表格
+    """
+    def moment(timestamp: float) -> str:
+        return time.strftime("%d %H:%M:%S", time.localtime(timestamp))
+
+    events = sorted(events)
+    timeline = {
+        "title": "事件时间线",
+        "heads": ["时间", "类型", "对象", "详情", f"{window}s内响应异常"],
+        "lines": []
+    }
+
+    related = {
+        "title": "事件相关的响应异常",
+        "heads": ["开始时间", "持续(s)", "90%ile峰值", "基线", "倍数", "相关事件"],
+        "lines": []
+    }
+
+    for timestamp, kind, target, detail in events:
+        count = sum(1 for start, end, _, _ in episodes if start - window <= timestamp <= end + window)
+        timeline["lines"].append([moment(timestamp), kind, target, detail, count])
+
+    for start, end, peak, base in episodes:
+        nearby = [f"{kind} {target} ({round(timestamp - start):+d}s)" for timestamp, kind, target, _ in events
+                  if start - window <= timestamp <= end + window]
+        if not nearby:
+            continue
+
+        related["lines"].append([moment(start), round(end - start, 1), round(peak, 1), round(base, 1),
+                                 round(peak / base, 1) if base else "-", "; ".join(nearby)])
+
+    if episodes and not related["lines"]:
+        logger.info(f"响应时间异常 {len(episodes)} 段，{window}s 内没有事件")
+
+    return [timeline, related]
@@ -0,0 +1,128 @@
+import math
+
+from typing import Optional
+
+
+class Histogram:
+    """
+    HDR 风格的对数线性直方图
+    数值(微秒)按 2 的幂划分量级，每个量级内再等分为若干子桶，保证任意数值的相对误差不超过 10^-digits。
+    桶数量只取决于数值范围与精度，与样本数量无关；两个精度相同的直方图可以直接相加合并
+    """
+
+    # 记录上限 1 小时，超出的数值按上限记录
+    highest = 3600 * 1000 * 1000
+
+    def __init__(self, digits: int = 2):
+        self.digits = digits
+
+        # 子桶位数。量级 0 内的数值精确记录，之后每个量级有 2^(bits-1) 个子桶
+        self.bits = math.ceil(math.log2(2 * 10 ** digits))
+        self.half = 1 << (self.bits - 1)
+
+        # 稀疏存储 桶序号 -> 样本数
+        self.counts = {}
+        self.count = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def index(self, value: int) -> int:
+        """
+        数值所在的桶序号
+        """
+        shift = max(value.bit_length() - self.bits, 0)
+        return (shift << (self.bits - 1)) + (value >> shift)
+
+    def value(self, index: int) -> int:
+        """
+        桶的代表值，取桶区间的中点
+        """
+        if index < (self.half << 1):
+            return index
+
+        shift = (index >> (self.bits - 1)) - 1
+        sub = index - (shift << (self.bits - 1))
+        return (sub << shift) + (1 << shift) // 2
+
+    def record(self, response_time: float, count: int = 1):
+        """
+        记录一个响应时间
+        :param response_time: 毫秒
+        :param count: 样本数
+        """
+        value = min(max(int(response_time * 1000), 0), self.highest)
+        index = self.index(value)
+
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other: "Histogram"):
+        """
+        合并另一个直方图
+        """
+        if other.digits != self.digits:
+            raise RuntimeError("直方图精度不一致，无法合并")
+
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        计算分位值
+        :param percent: 0 ~ 1
+        :return: 毫秒
+        """
+        if not self.count:
+            return None
+
+        if percent >= 1:
+            return self.max / 1000
+
+        target = max(math.ceil(self.count * percent), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.value(index), self.max) / 1000
+
+        return self.max / 1000
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count / 1000 if self.count else None
+
+    def items(self) -> list:
+        """
+        按数值升序返回 (代表值(ms), 样本数) 列表
+        """
+        return [(self.value(index) / 1000, self.counts[index]) for index in sorted(self.counts)]
+
+    def serialize(self) -> list:
+        """
+        序列化为可通过 msgpack 传输的结构
+        """
+        return [self.digits, list(self.counts.keys()), list(self.counts.values()), self.count, self.sum,
+                self.min, self.max]
+
+    @classmethod
+    def deserialize(cls, data: list) -> "Histogram":
+        digits, indexes, counts, count, total, low, high = data
+
+        histogram = cls(digits)
+        histogram.counts = dict(zip(indexes, counts))
+        histogram.count = count
+        histogram.sum = total
+        histogram.min = low
+        histogram.max = high
+
+        return histogram
@@ -0,0 +1,148 @@
+import gevent
+
+from typing import Callable, Optional
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from honeypot.libs.utils import logger
+
+
+class Informer:
+    """
+    k8s 资源的本地缓存
+    先 list 一次全量并记录 resourceVersion，之后通过 watch 只接收增量事件更新缓存；
+    resourceVersion 过期(410 Gone)时重新 list。读取都走本地缓存，不再反复全量查询
+    支持 label_selector/field_selector 限定范围，list 与 watch 使用相同的条件；
+    可订阅增量事件，处理函数接收 (事件类型, 旧对象, 新对象)，旧对象为缓存中的上一个版本
+    """
+
+    # 单次 watch 的超时时间(s)，超时后从最新的 resourceVersion 继续
+    timeout = 300
+
+    # watch 异常后的重试间隔(s)
+    backoff = 5
+
+    def __init__(self, list_func: Callable, *args, label_selector: str = None, field_selector: str = None):
+        """
+        :param list_func: list 接口，如 CoreV1Api.list_namespaced_pod、CustomObjectsApi.list_namespaced_custom_object
+        :param args: list 接口的位置参数，如命名空间
+        :param label_selector: 标签选择器
+        :param field_selector: 字段选择器
+        """
+        self.list_func = list_func
+        self.args = args
+        self.selectors = {}
+        if label_selector:
+            self.selectors["label_selector"] = label_selector
+        if field_selector:
+            self.selectors["field_selector"] = field_selector
+
+        # 名字 -> 对象
+        self.cache = {}
+        self.resource_version = None
+        self.greenlet = None
+        self.watcher = None
+        self.handlers = []
+
+    @staticmethod
+    def metadata(obj, key: str):
+        """
+        兼容类型化对象及字典对象(自定义资源)的元数据读取
+        """
+        if isinstance(obj, dict):
+            return obj.get("metadata", {}).get(key)
+
+        return getattr(obj.metadata, key)
+
+    def list(self):
+        """
+        全量查询，重建缓存
+        """
+        res = self.list_func(*self.args, **self.selectors)
+        items = res["items"] if isinstance(res, dict) else res.items
+        self.cache = {self.metadata(item, "name"): item for item in items}
+        self.resource_version = res["metadata"]["resourceVersion"] if isinstance(res, dict) \
+            else res.metadata.resource_version
+
+    def subscribe(self, handler: Callable):
+        """
+        订阅增量事件，重新 list 时不产生事件
+        """
+        self.handlers.append(handler)
+        return self
+
+    def start(self):
+        """
+        首次全量查询在当前协程中完成，之后在后台协程中持续 watch
+        """
+        self.list()
+        self.greenlet = gevent.spawn(self.run)
+        return self
+
+    def stop(self):
+        if self.watcher:
+            self.watcher.stop()
+        if self.greenlet:
+            self.greenlet.kill(block=False)
+            self.greenlet = None
+
+    def run(self):
+        while True:
+            try:
+                self.watch()
+            except ApiException as e:
+                if e.status == 410:
+                    self.relist()
+                    continue
+
+                logger.warning(f"k8s watch 异常，{self.backoff}s 后重试: {e.reason}")
+                gevent.sleep(self.backoff)
+            except Exception as e:
+                logger.warning(f"k8s watch 异常，{self.backoff}s 后重试: {e}")
+                gevent.sleep(self.backoff)
+
+    def relist(self):
+        try:
+            self.list()
+        except Exception as e:
+            logger.warning(f"k8s list 异常，{self.backoff}s 后重试: {e}")
+            gevent.sleep(self.backoff)
+
+    def watch(self):
+        """
+        从当前 resourceVersion 开始接收增量事件
+        """
+        self.watcher = watch.Watch()
+        for event in self.watcher.stream(self.list_func, *self.args, resource_version=self.resource_version,
+                                         timeout_seconds=self.timeout, **self.selectors):
+            kind, obj = event["type"], event["object"]
+
+            # 410 Gone 以 ERROR 事件的形式返回
+            if kind == "ERROR":
+                code = obj.get("code") if isinstance(obj, dict) else getattr(obj, "code", None)
+                if code == 410:
+                    self.relist()
+                    return
+                continue
+
+            name = self.metadata(obj, "name")
+            old = self.cache.get(name)
+            if kind == "DELETED":
+                self.cache.pop(name, None)
+            elif kind in ("ADDED", "MODIFIED"):
+                self.cache[name] = obj
+
+            for handler in self.handlers if kind in ("ADDED", "MODIFIED", "DELETED") else []:
+                try:
+                    handler(kind, old, obj)
+                except Exception as e:
+                    logger.warning(f"k8s 事件处理异常: {e}")
+
+            version = self.metadata(obj, "resourceVersion" if isinstance(obj, dict) else "resource_version")
+            self.resource_version = version or self.resource_version
+
+    def items(self) -> list:
+        return list(self.cache.values())
+
+    def get(self, name: str) -> Optional[object]:
+        return self.cache.get(name)
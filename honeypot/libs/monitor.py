@@ -1,9 +1,11 @@
-import io
 import os
-import math
+import re
 import time
+import socket
+import numpy as np
 
-from typing import Optional, Tuple, List
+from typing import Optional, Callable
+from gevent.pool import Pool
 from requests import session
 from email.mime.image import MIMEImage
 from kubernetes import client, config
@@ -11,127 +13,13 @@ from kubernetes import client, config
 from honeypot import CONFIG_DIR
 from honeypot.libs.utils import logger
 from honeypot.libs.cio import load_yaml
-from honeypot.libs.cfaker import Dynamic
+from honeypot.libs.series import TimeSeries, Frame
+from honeypot.libs.informer import Informer
+from honeypot.libs.events import EventTimeline, anomalies
+from honeypot.libs.render import chart, draw, draw_many
 from honeypot.core.corntab import ScheduleJob
 
 
-def chart(x_axis: list, y_axis: Optional[Tuple[str, list] or List[Tuple[str, list]]],
-          fig_size: Tuple[int, int] = (16, 7), title=None, x_axis_point: int = 64,
-          x_label=None, y_label=None, grid=True, points=4320) -> bytes:
-    """
-    绘制折线图
-    :param x_axis: x 轴的值，要求是秒级时间戳
-    :param y_axis: y 轴的值，要求是多组数据，每一组对应一个折线
-    :param fig_size: 画布的尺寸比例
-    :param title: 图表标题
-    :param x_axis_point: x 轴坐标的点数，即控制 x 轴坐标显示的密度
-    :param x_label: x 轴标签
-    :param y_label: y 轴标签
-    :param grid: 是否画网格
-    :param grid: 是否画网格
-    :param points: 画布上最大的坐标点数
-    :return:
-    """
-    import matplotlib
-    matplotlib.use("agg")
-    
-    import matplotlib.pyplot as plot
-    from matplotlib import ticker
-
-    # 设置日志打印登记
-    plot.set_loglevel('WARNING')
-
-    figure, axis = plot.subplots(figsize=fig_size, dpi=100)
-    canvas = figure.canvas
-
-    # 准备曲线颜色，准备12种颜色对比明显的
-    colors = ["#00AA00", "#778899", "#CC6600", "#0088A8", "#990099", "#BBBB00"]
-
-    if not x_axis or not y_axis:
-        logger.warning("图表绘制异常，请检查参数 x_axis、y_axis")
-        raise RuntimeError("图表绘制异常，请检查参数 x_axis、y_axis")
-    else:
-        line_count = len(y_axis)
-
-        # 统计图按最大4320个坐标值来绘制。每5s采集一次、标准6小时
-        x_temp = []
-        step = len(x_axis) // points
-        for i in range(0, len(x_axis), step + 1):
-            t = x_axis[i]
-            if step:
-                t = sum(x_axis[i: i + step + 1]) // (step + 1)
-
-            x_temp.append(time.strftime("%d %H:%M:%S", time.localtime(t)))
-
-        for idx in range(line_count):
-            # 如果x轴和y轴值个数不同就不绘制
-            if len(x_axis) != len(y_axis[idx][1]):
-                continue
-
-            y_cur = y_axis[idx][1]
-            if step:
-                y_temp = []
-                for i in range(0, len(x_axis), step + 1):
-                    y_temp.append(round(sum(y_cur[i: i + step + 1]) // (step + 1), 2))
-                y_cur = y_temp
-
-            line_style = "dashed" if idx else "solid"
-            plot.plot(x_temp, y_cur, linestyle=line_style, linewidth=1.2,
-                      marker='', label=y_axis[idx][0], color=colors[idx % len(colors)])
-
-    # 指定默认字体：解决plot不能显示中文问题
-    # from pylab import mpl
-    # mpl.rcParams['font.sans-serif'] = ['STZhongsong']
-    # mpl.rcParams['axes.unicode_minus'] = False
-
-    # 设置 x 轴显示密度
-    tick_spacing = math.ceil(len(x_temp) / x_axis_point)
-    axis.xaxis.set_major_locator(ticker.MultipleLocator(tick_spacing))
-
-    # 设置 x 轴最左刻度和最右刻度
-    # axis.set_xlim(left=x_axis[0], right=x_axis[-1])
-    axis.set_xlim(auto=True)
-
-    # 设置 x 坐标轴刻度的旋转方向和大小，x 轴通常是时间，为了避免重叠问题，将文本纵向展示
-    # rotation: 旋转方向
-    plot.xticks(rotation=90, fontsize=8)
-
-    # 显示图例
-    plot.legend(loc=2)
-    params = {'legend.fontsize': 10}
-    plot.rcParams.update(params)
-
-    # 显示网格
-    if grid:
-        plot.grid(True, linestyle='--', alpha=0.7)
-
-    # 图片、X轴、Y轴的标签
-    if x_label:
-        plot.xlabel(x_label, fontsize=12)
-    if y_label:
-        plot.ylabel(y_label, fontsize=12)
-    if title:
-        plot.title(title, fontsize=14)
-
-    # 调整画布留白
-    # 四个坐标值分别表示以左下角为原点的四个边的坐标，最大为1；
-    # wspace和hspace则分别表示水平方向上图像间的距离和垂直方向上图像间的距离，有多个画布在一张图中时使用
-    plot.subplots_adjust(top=0.94, bottom=0.12, right=0.96, left=0.06, hspace=0, wspace=0)
-
-    # 紧凑布局
-    plot.tight_layout()
-
-    # 获取图像流
-    buffer = io.BytesIO()
-    canvas.print_png(buffer)
-    stream = buffer.getvalue()
-
-    # 清理缓存
-    buffer.close()
-
-    return stream
-
-
 class GrafanaMonitor:
     """
     Grafana 监控面板截图
@@ -187,7 +75,13 @@ class KubernetesMonitor:
     # 实例状态，默认不可用
     status = False
 
-    def __init__(self, namespace=None, config_yaml=None):
+    def __init__(self, namespace=None, config_yaml=None, label_selector=None, field_selector=None):
+        """
+        :param namespace: 命名空间
+        :param config_yaml: kube_config 文件名
+        :param label_selector: 标签选择器，限定监控的 pod、副本集及指标范围
+        :param field_selector: 字段选择器，只作用于 pod
+        """
         if namespace:
             if not config_yaml:
                 config_yaml = "kube-admin.yaml"
@@ -208,6 +102,7 @@ class KubernetesMonitor:
                     config.kube_config.load_kube_config(self.config_yaml)
                     self.core_api = client.CoreV1Api()
                     self.custom_api = client.CustomObjectsApi()
+                    self.autoscaling_api = client.AutoscalingV1Api()
                 except:
                     pass
                 else:
@@ -217,56 +112,102 @@ class KubernetesMonitor:
                     # metric标识
                     self.metric = True
 
-                    # pod重启次数记录
+                    # 查询范围
+                    self.label_selector = label_selector
+                    self.field_selector = field_selector
+
+                    # pod重启次数记录，首次发现 pod 时的重启次数
                     self.restart = {}
 
                     # 微服务资源配置信息，分两个纬度记录
                     self.service_quotas = {"SERVICE": {}, "POD": {}}
+
+                    # pod 重启、就绪变化及 HPA 扩缩容等事件，由 watch 事件得到
+                    self.timeline = EventTimeline()
+
+                    # pod、副本集及 HPA 的本地缓存，list 一次之后通过 watch 增量更新
+                    self.pods = None
+                    self.replicas = []
+                    self.hpa = None
+                    self._start_informers()
                     self._collect_quotas()
 
-                    # 微服务资源使用信息
-                    self.usage = {"SERVICE": {}, "POD": {}}
+                    # 微服务资源使用信息，共享时间索引的列式存储
+                    # 列名 ("SERVICE", 微服务, 指标) / ("POD", 微服务, pod, 指标)，指标为 cpu/mem
+                    self.usage = Frame()
 
                     # 添加监控任务
                     ScheduleJob.add_job(self.record_usage, interval=5)
 
-    def _collect_quotas(self):
+    def _start_informers(self):
         """
-        收集微服务和pod的资源信息
+        启动 pod、副本集及 HPA 的 informer
         """
         try:
-            res = self.core_api.list_namespaced_pod(namespace=self.namespace)
+            self.pods = Informer(self.core_api.list_namespaced_pod, self.namespace,
+                                 label_selector=self.label_selector, field_selector=self.field_selector)
+            self.pods.subscribe(self.timeline.on_pod).start()
         except Exception as e:
             logger.error(f"k8s 微服务及POD信息获取失败: {str(e)}")
             self.status = False
-        else:
-            for pod in res.items:
-                pod_name = pod.metadata.name
-                # pod 下的容器
-                containers = pod.spec.containers
-
-                # 起始pod重启次数
-                container_statuses = pod.status.container_statuses
-
-                for container in containers:
-                    resources = container.resources
-                    service_name = container.name
-                    cpu_requests = self.format_quota(resources.requests["cpu"])
-                    cpu_limits = self.format_quota(resources.limits["cpu"])
-                    mem_requests = self.format_quota(resources.requests["memory"])
-                    mem_limits = self.format_quota(resources.limits["memory"])
-
-                    # 记录quota
-                    self.service_quotas["POD"].setdefault(service_name, {})[pod_name] \
-                        = [cpu_requests, cpu_limits, mem_requests, mem_limits]
-
-                if container_statuses:
-                    for status in container_statuses:
-                        service_name = status.name
-                        self.restart.setdefault(service_name, {})[pod_name] = status.restart_count
-
-            # 聚合得到服务纬度的资源信息
-            self.service_quotas["SERVICE"] = self.merge_quotas(self.service_quotas["POD"])
+            return
+
+        for plural in ("statefulsets", "replicasets"):
+            try:
+                self.replicas.append(Informer(self.custom_api.list_namespaced_custom_object, 'apps', 'v1',
+                                              self.namespace, plural, label_selector=self.label_selector).start())
+            except Exception as e:
+                logger.error(f"k8s 副本集信息获取失败: {str(e)}")
+
+        try:
+            self.hpa = Informer(self.autoscaling_api.list_namespaced_horizontal_pod_autoscaler, self.namespace,
+                                label_selector=self.label_selector)
+            self.hpa.subscribe(self.timeline.on_hpa).start()
+        except Exception as e:
+            self.hpa = None
+            logger.error(f"k8s HPA 信息获取失败: {str(e)}")
+
+    def close(self):
+        """
+        停止 informer 的后台 watch
+        """
+        for informer in [getattr(self, "pods", None), getattr(self, "hpa", None)] + getattr(self, "replicas", []):
+            if informer:
+                informer.stop()
+
+    def _collect_quotas(self):
+        """
+        从 pod 缓存中收集微服务和pod的资源信息
+        已记录的 pod 保留，测试过程中新建的 pod 追加记录
+        """
+        if not self.pods:
+            return
+
+        for pod in self.pods.items():
+            pod_name = pod.metadata.name
+            if not pod.spec:
+                continue
+
+            # pod 下的容器
+            for container in pod.spec.containers:
+                service_name = container.name
+                if pod_name in self.service_quotas["POD"].get(service_name, {}):
+                    continue
+
+                requests = (container.resources and container.resources.requests) or {}
+                limits = (container.resources and container.resources.limits) or {}
+
+                # 记录quota
+                self.service_quotas["POD"].setdefault(service_name, {})[pod_name] = [
+                    self.format_quota(requests.get("cpu", "0")), self.format_quota(limits.get("cpu", "0")),
+                    self.format_quota(requests.get("memory", "0")), self.format_quota(limits.get("memory", "0"))]
+
+            # 起始pod重启次数
+            for status in (pod.status and pod.status.container_statuses) or []:
+                self.restart.setdefault(status.name, {}).setdefault(pod_name, status.restart_count)
+
+        # 聚合得到服务纬度的资源信息
+        self.service_quotas["SERVICE"] = self.merge_quotas(self.service_quotas["POD"])
 
     @property
     def namespace_resource(self):
@@ -319,29 +260,9 @@ class KubernetesMonitor:
         }
         lines = []
 
-        try:
+        if self.status:
             # 收集分片信息
-            res1 = self.custom_api.list_namespaced_custom_object('apps', 'v1', self.namespace, 'statefulsets')
-            res2 = self.custom_api.list_namespaced_custom_object('apps', 'v1', self.namespace, 'replicasets')
-        except Exception as e:
-            logger.error(f"k8s 副本集信息获取失败: {str(e)}")
-        else:
-            replicas = {}
-            for item in res1["items"] + res2["items"]:
-                container_name = item['spec']['template']['spec']['containers'][0]['name']
-                replica_set = item['metadata']['name']
-                expect = item['spec'].get('replicas', 0)
-
-                # 如果当前副本管理器副本数为0，则不统计
-                if expect == 0:
-                    continue
-
-                real = item['status'].get('replicas', 0)
-                ready = item['status'].get('readyReplicas', 0)
-                available = item['status'].get('readyReplicas', 0) or item['status'].get('availableReplicas', 0)
-
-                # 一个服务可能有多个副本管理器
-                replicas.setdefault(container_name, []).append([replica_set, expect, real, ready, available])
+            replicas = self.replica_sets()
 
             for service, line in self.service_quotas["SERVICE"].items():
                 service_replicas = replicas.get(service, [["-", "-", "-", "-", "-"]])
@@ -351,6 +272,30 @@ class KubernetesMonitor:
         table["lines"] = lines
         return table
 
+    def replica_sets(self) -> dict:
+        """
+        副本集信息
+        :return: {微服务(容器名): [[副本集, 预期数, 实际数, 就绪数, 可用数], ...]}
+        """
+        replicas = {}
+        for item in [item for informer in self.replicas for item in informer.items()]:
+            container_name = item['spec']['template']['spec']['containers'][0]['name']
+            replica_set = item['metadata']['name']
+            expect = item['spec'].get('replicas', 0)
+
+            # 如果当前副本管理器副本数为0，则不统计
+            if expect == 0:
+                continue
+
+            real = item['status'].get('replicas', 0)
+            ready = item['status'].get('readyReplicas', 0)
+            available = item['status'].get('readyReplicas', 0) or item['status'].get('availableReplicas', 0)
+
+            # 一个服务可能有多个副本管理器
+            replicas.setdefault(container_name, []).append([replica_set, expect, real, ready, available])
+
+        return replicas
+
     @property
     def pod_resource(self):
         """
@@ -363,42 +308,75 @@ class KubernetesMonitor:
         }
         lines = []
 
-        if self.status:
-            try:
-                # 生成表格时，再查询一次重启次数，与测试开始的记录做差，得到过程中的重启次数
-                res = self.core_api.list_namespaced_pod(namespace=self.namespace)
-            except Exception as e:
-                logger.error(f"k8s 微服务及POD信息获取失败: {str(e)}")
-            else:
-                for pod in res.items:
-                    pod_name = pod.metadata.name
-                    container_statuses = pod.status.container_statuses
-
-                    if container_statuses:
-                        for status in container_statuses:
-                            service_name = status.name
-                            self.restart[service_name][pod_name] = \
-                                status.restart_count - self.restart.get(service_name, {}).get(pod_name, 0)
-
+        restart = self.restarts() if self.status else {}
         for service, pods in self.service_quotas["POD"].items():
             for pod, line in pods.items():
-                lines.append([service, pod] + line + [self.restart.get(service, {}).get(pod, 0)])
+                lines.append([service, pod] + line + [restart.get(service, {}).get(pod, 0)])
 
         table["lines"] = lines
         return table
 
+    def restarts(self) -> dict:
+        """
+        测试过程中的重启次数
+        缓存中的当前重启次数与首次发现 pod 时的记录做差
+        :return: {微服务(容器名): {pod: 重启次数}}
+        """
+        restart = {}
+        for pod in self.pods.items() if self.pods else []:
+            for status in (pod.status and pod.status.container_statuses) or []:
+                base = self.restart.get(status.name, {}).get(pod.metadata.name, status.restart_count)
+                restart.setdefault(status.name, {})[pod.metadata.name] = status.restart_count - base
+
+        return restart
+
+    def throttles(self, ratio: float = 0.95) -> list:
+        """
+        pod CPU 使用量达到 limits 的时刻(由低于阈值变为高于阈值)，视为开始被限流
+        :param ratio: 使用量占 limits 的比例阈值
+        :return: [(时间戳, "throttle", 对象, 详情), ...]
+        """
+        pods = [(service, pod, quota[1]) for service, items in self.service_quotas["POD"].items()
+                for pod, quota in items.items() if quota[1]]
+        if not pods:
+            return []
+
+        times, matrix = self.usage.read([("POD", service, pod, "cpu") for service, pod, _ in pods], "max")
+        limits = np.array([limit for _, _, limit in pods])
+        over = np.nan_to_num(matrix / limits) >= ratio
+        rising = over & ~np.vstack([np.zeros((1, len(pods)), dtype=bool), over[:-1]])
+
+        return [(round(float(times[row]), 2), "throttle", f"{pods[col][1]}/{pods[col][0]}",
+                 f"cpu {round(float(matrix[row, col]), 3)}/{limits[col]}")
+                for row, col in zip(*np.nonzero(rising))]
+
+    @property
+    def events(self) -> list:
+        """
+        测试过程中的 k8s 事件，按时间排序
+        :return: [(时间戳, 类型, 对象, 详情), ...]
+        """
+        return sorted(self.timeline.events + self.throttles())
+
     def record_usage(self):
         """
         记录资源使用情况
         """
         if self.status and self.metric:
+            # 指标接口不支持 watch，通过标签选择器限定查询范围
+            selectors = {"label_selector": self.label_selector} if self.label_selector else {}
             try:
-                res = self.custom_api.list_namespaced_custom_object('metrics.k8s.io', 'v1beta1', self.namespace, 'pods')
+                res = self.custom_api.list_namespaced_custom_object('metrics.k8s.io', 'v1beta1', self.namespace, 'pods',
+                                                                    **selectors)
             except Exception as e:
                 logger.error(f"k8s metric信息查询失败: {str(e)}")
                 self.metric = False
             else:
-                temp = {}
+                # 补充新建 pod 的配额，只统计缓存范围内的 pod
+                self._collect_quotas()
+
+                keys, values = [], []
+                services = {}
                 for item in res['items']:
                     pod_name = item['metadata']['name']
                     for container in item['containers']:
@@ -414,14 +392,62 @@ class KubernetesMonitor:
                                     ('aiforce', 'algorithm', 'web', 'jaeger', 'xtrabackup', 'ddp')]):
                                 continue
 
+                        if pod_name not in self.service_quotas["POD"].get(service_name, {}):
+                            continue
+
                         cpu_usage = self.format_quota(container['usage']['cpu'])
                         mem_usage = self.format_quota(container['usage']['memory'])
 
-                        temp.setdefault(service_name, {})[pod_name] = [cpu_usage, mem_usage]
+                        keys.extend([("POD", service_name, pod_name, "cpu"), ("POD", service_name, pod_name, "mem")])
+                        values.extend([cpu_usage, mem_usage])
+
+                        total = services.setdefault(service_name, [0.0, 0.0])
+                        total[0] += cpu_usage
+                        total[1] += mem_usage
+
+                for service, (cpu_usage, mem_usage) in services.items():
+                    keys.extend([("SERVICE", service, "cpu"), ("SERVICE", service, "mem")])
+                    values.extend([cpu_usage, mem_usage])
+
+                if keys:
+                    self.usage.append(round(time.time(), 2), keys, values)
+
+    def usage_summary(self, start: float = None, end: float = None) -> list:
+        """
+        各微服务在时间范围内的资源使用汇总
+        :param start: 起始时间戳，默认不限
+        :param end: 结束时间戳，默认不限
+        :return: [(微服务, 平均CPU, 最大CPU, 平均内存, 最大内存, CPU limits, 内存 limits), ...]  CPU 单位核，内存单位G
+        """
+        services = list(self.service_quotas["SERVICE"])
+        avg, peak = self.usage.summary([("SERVICE", service, metric) for service in services
+                                        for metric in ("cpu", "mem")], start, end)
+
+        lines = []
+        for idx, service in enumerate(services):
+            cpu, mem = idx * 2, idx * 2 + 1
+            if np.isnan(avg[cpu]):
+                continue
+
+            quota = self.service_quotas["SERVICE"][service]
+            lines.append((service, round(float(avg[cpu]), 3), round(float(peak[cpu]), 3),
+                          round(float(avg[mem]), 3), round(float(peak[mem]), 3), quota[1], quota[3]))
 
-                s_time = round(time.time(), 2)
-                self.usage['SERVICE'][s_time] = self.merge_quotas(temp)
-                self.usage['POD'][s_time] = temp
+        return lines
+
+    @property
+    def cpu_percent(self) -> Optional[float]:
+        """
+        最近一次采样中，各微服务 CPU 使用量占 limits 百分比的最大值
+        """
+        services = self.service_quotas["SERVICE"]
+        limits = np.array([quota[1] for quota in services.values()])
+        usage = self.usage.last([("SERVICE", service, "cpu") for service in services])
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            percents = np.where(limits > 0, usage / limits * 100, np.nan)
+
+        return round(float(np.nanmax(percents)), 3) if not np.isnan(percents).all() else None
 
     @property
     def service_usage_charts(self) -> list:
@@ -430,123 +456,779 @@ class KubernetesMonitor:
         每张图表示一个微服务以及归属它的pod
         :return:
         """
-        x_axis = list(self.usage['SERVICE'].keys())
-
-        scp = {}
-        smp = {}
-        # 微服务级别
-        for single in self.usage['SERVICE'].values():
-            for service, usage in single.items():
-                cpu_usage, mem_usage = usage
-                base = self.service_quotas['SERVICE'][service]
-                scp.setdefault(service, []).append(self.operate_quota(cpu_usage, base[1], "/"))
-                smp.setdefault(service, []).append(self.operate_quota(mem_usage, base[3], "/"))
-
-        pcp = {}
-        pmp = {}
-        # pod级别
-        for single in self.usage['POD'].values():
-            for service, pods in single.items():
-                for pod, usage in pods.items():
-                    cpu_usage, mem_usage = usage
-                    base = self.service_quotas['POD'][service][pod]
-                    pcp.setdefault(service, {}).setdefault(pod, []).append(self.operate_quota(cpu_usage, base[1], "/"))
-                    pmp.setdefault(service, {}).setdefault(pod, []).append(self.operate_quota(mem_usage, base[3], "/"))
-
-        # 生成chart
-        charts = []
-        for service, scl in scp.items():
-            cpu_y_axis = [(service, scl)]
-            mem_y_axis = [(service, smp[service])]
-            for pod, pod_line in pcp[service].items():
-                cpu_y_axis.append((pod, pod_line))
-                mem_y_axis.append((pod, pmp[service][pod]))
-
-            base = self.service_quotas['SERVICE'][service]
-            cpu_chart = chart(x_axis, cpu_y_axis, title=f"{service} ({base[1]})",
-                              y_label="cpu use percent")
-            mem_chart = chart(x_axis, mem_y_axis, title=f"{service} ({base[3]})",
-                              y_label="memory use percent")
-
-            # 生成邮件可直接使用的数据结构
-            charts.append((f"{service} (CPU)", Dynamic.random_str(12), MIMEImage(cpu_chart)))
-            charts.append((f"{service} (MEM)", Dynamic.random_str(12), MIMEImage(mem_chart)))
-
-        return charts
+        # 所有微服务及 pod 的列一次读出，按 limits 向量化换算为百分比
+        # 每张图的折线: [(折线名, 列名前缀, limits), ...]，第一条为微服务，其余为归属它的 pod
+        groups = []
+        for service, base in self.service_quotas["SERVICE"].items():
+            lines = [(service, ("SERVICE", service), base)]
+            lines.extend((pod, ("POD", service, pod), quota)
+                         for pod, quota in self.service_quotas["POD"].get(service, {}).items())
+            groups.append((service, base, lines))
+
+        keys, limits = [], []
+        for _, _, lines in groups:
+            for _, prefix, quota in lines:
+                keys.extend([prefix + ("cpu",), prefix + ("mem",)])
+                limits.extend([quota[1], quota[3]])
+
+        # 合并后的行取最大值，保留资源使用的峰值
+        x_axis, matrix = self.usage.read(keys, "max")
+        if not len(x_axis):
+            return []
+
+        limits = np.array(limits)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            percents = np.round(np.where(limits > 0, matrix / limits * 100, 0.0), 3)
+
+        # 整理绘图参数
+        names = []
+        jobs = []
+        x_axis = x_axis.tolist()
+        column = 0
+        for service, base, lines in groups:
+            cpu_y_axis, mem_y_axis = [], []
+            for name, _, _ in lines:
+                cpu_y_axis.append((name, percents[:, column].tolist()))
+                mem_y_axis.append((name, percents[:, column + 1].tolist()))
+                column += 2
+
+            names.extend([f"{service} (CPU)", f"{service} (MEM)"])
+            jobs.append({"x_axis": x_axis, "y_axis": cpu_y_axis, "title": f"{service} ({base[1]})",
+                         "y_label": "cpu use percent"})
+            jobs.append({"x_axis": x_axis, "y_axis": mem_y_axis, "title": f"{service} ({base[3]})",
+                         "y_label": "memory use percent"})
+
+        # 多进程并行绘制，生成邮件可直接使用的数据结构
+        return draw_many(names, jobs)
+
+    # k8s 数量单位换算，CPU 单位核，内存单位 G
+    units = {
+        "n": 1e-9, "u": 1e-6, "m": 1e-3,
+        "Ki": 1 / 1024 ** 2, "Mi": 1 / 1024, "Gi": 1, "Ti": 1024,
+        "K": 1 / 1024 ** 2, "M": 1 / 1024, "G": 1, "T": 1024
+    }
 
     @staticmethod
-    def format_quota(val):
-        """
-        格式化k8s参数指标
-        """
-        if not isinstance(val, str):
-            val = str(str)
-
-        # 格式化CPU，单位用G
-        if val.isdigit():
-            return val
-        elif 'm' in val:
-            return round(int(val[:-1]) / 1000, 3)
-
-        # 格式化内存，单位用 G
-        elif 'Mi' in val:
-            return round(int(val[:-2]) / 1024, 3)
-        elif 'Gi' in val:
-            return val[:-2]
-        elif 'Ki' in val:
-            return round(int(val[:-2]) / (1024 * 1024), 3)
-        elif 'M' in val:
-            return round(int(val[:-1]) / 1024, 3)
-        elif 'G' in val:
-            return val[:-1]
-        elif 'K' in val:
-            return round(int(val[:-1]) / (1024 * 1024), 3)
-
-        return 0.0
+    def format_quota(val) -> float:
+        """
+        格式化k8s参数指标，统一转换为浮点数，CPU 单位核，内存单位 G
+        """
+        val = str(val).strip()
+        for unit in ("Ki", "Mi", "Gi", "Ti", "n", "u", "m", "K", "M", "G", "T"):
+            if val.endswith(unit):
+                number, scale = val[:-len(unit)], KubernetesMonitor.units[unit]
+                break
+        else:
+            number, scale = val, 1
+
+        try:
+            return round(float(number) * scale, 3)
+        except ValueError:
+            return 0.0
 
     @staticmethod
-    def operate_quota(v1, v2, op) -> Optional[str]:
+    def merge_quotas(data: dict) -> dict:
         """
-        操作运算
-        v1,v2 应该是 format 之后的标准值
-        op: + - * /
+        将 pod 纬度的数值按微服务求和
+        {微服务: {pod: [v1, v2, ...]}} -> {微服务: [v1, v2, ...]}
         """
-        if isinstance(v1, str):
-            v1 = float(v1)
+        return {service: [round(sum(values), 3) for values in zip(*pods.values())]
+                for service, pods in data.items() if pods}
 
-        if isinstance(v2, str):
-            v2 = float(v2)
 
-        if op == "+":
-            return round(v1 + v2, 3)
-        elif op == "-":
-            return round(v1 - v2, 3)
-        elif op == "*":
-            return round(v1 * v2, 3)
-        elif op == "/":
-            # 除法运算时，返回百分比
-            return round((v1 / v2) * 100, 3)
+class PrometheusMonitor(KubernetesMonitor):
+    """
+    基于 Prometheus 兼容接口(query_range)的 k8s 资源信息
+    测试过程中不做任何采集，测试结束时按测试时间窗口并发执行范围查询，结果写入与 KubernetesMonitor 相同的结构，
+    复用其表格及图表。查询结果按 (接口, 参数) 缓存，多次读取只查询一次。
+    配置文件放在 config 目录下，格式参考 scripts/config/demo_prometheus.yaml，查询语句中的 $namespace、$window
+    替换为命名空间及测试时长
+    """
 
-    @staticmethod
-    def merge_quotas(data):
+    # 默认查询，依赖 cAdvisor 及 kube-state-metrics 指标。CPU 单位核，内存单位 G
+    queries = {
+        "cpu": 'sum by (container, pod) (rate(container_cpu_usage_seconds_total'
+               '{namespace="$namespace", container!="", container!="POD"}[1m]))',
+        "mem": 'sum by (container, pod) (container_memory_working_set_bytes'
+               '{namespace="$namespace", container!="", container!="POD"}) / 1073741824',
+        "cpu.requests": 'sum by (container, pod) (kube_pod_container_resource_requests'
+                        '{namespace="$namespace", resource="cpu"})',
+        "cpu.limits": 'sum by (container, pod) (kube_pod_container_resource_limits'
+                      '{namespace="$namespace", resource="cpu"})',
+        "mem.requests": 'sum by (container, pod) (kube_pod_container_resource_requests'
+                        '{namespace="$namespace", resource="memory"}) / 1073741824',
+        "mem.limits": 'sum by (container, pod) (kube_pod_container_resource_limits'
+                      '{namespace="$namespace", resource="memory"}) / 1073741824',
+        "restarts": 'max by (container, pod) (increase(kube_pod_container_status_restarts_total'
+                    '{namespace="$namespace"}[$window]))',
+        "quota": 'kube_resourcequota{namespace="$namespace"}',
+        "events.restarts": 'max by (container, pod) (kube_pod_container_status_restarts_total'
+                           '{namespace="$namespace"})',
+        "events.oom": 'max by (container, pod) (kube_pod_container_status_last_terminated_reason'
+                      '{namespace="$namespace", reason="OOMKilled"})',
+        "events.ready": 'max by (pod) (kube_pod_status_ready{namespace="$namespace", condition="true"})',
+        "events.scale": 'max by (horizontalpodautoscaler) (kube_horizontalpodautoscaler_status_desired_replicas'
+                        '{namespace="$namespace"})'
+    }
+
+    def __init__(self, namespace=None, config_yaml=None, window: Callable[[], tuple] = None):
         """
-        将特定结构的数据按上一级纬度整合
-        :param data:
-        :return:
+        :param namespace: 命名空间
+        :param config_yaml: 配置文件名
+        :param window: 返回测试时间窗口 (开始时间戳, 结束时间戳) 的函数，在首次读取数据时调用
+        """
+        self.namespace = namespace
+        self.window = window or (lambda: (time.time() - 3600, time.time()))
+
+        path = os.path.join(CONFIG_DIR, config_yaml or "prometheus.yaml")
+        if not path.endswith(".yaml"):
+            path += ".yaml"
+
+        if not namespace:
+            return
+        if not os.path.exists(path):
+            logger.error(f"prometheus 配置文件不存在({path})")
+            return
+
+        self.config = load_yaml(path) or {}
+        self.host = self.config.get("host", "").rstrip("/")
+        if not self.host:
+            logger.error(f"prometheus 配置缺少 host({path})")
+            return
+
+        self.client = session()
+        self.client.headers.update(self.config.get("headers") or {})
+        self.step = self.config.get("step", 15)
+        self.concurrency = self.config.get("concurrency", 8)
+        self.timeout = self.config.get("timeout", 30)
+        self.queries = {**self.queries, **(self.config.get("usage") or {})}
+
+        # 查询结果缓存 {(接口, 参数): 结果}
+        self.cache = {}
+        self.collected = None
+
+        # 与 KubernetesMonitor 相同的数据结构，收集之后才有数据
+        self.service_quotas = {"SERVICE": {}, "POD": {}}
+        self.usage = Frame()
+        self.restart = {}
+        self.quota = []
+        self.extras = []
+        self.timeline = EventTimeline()
+
+        # 测试过程中不采集，不需要 pod 及副本集缓存
+        self.pods = None
+        self.replicas = []
+        self.status = True
+
+    def close(self):
+        if self.status:
+            self.client.close()
+
+    def expr(self, query: str, start: float, end: float) -> str:
+        return query.replace("$namespace", self.namespace).replace("$window", f"{max(int(end - start), 1)}s")
+
+    def request(self, api: str, params: dict) -> list:
+        """
+        查询接口，结果缓存
+        :return: 结果中的 result 列表，查询失败时为空列表
+        """
+        key = (api, tuple(sorted(params.items())))
+        if key in self.cache:
+            return self.cache[key]
+
+        try:
+            res = self.client.get(f"{self.host}/api/v1/{api}", params=params, timeout=self.timeout)
+            body = res.json()
+        except Exception as e:
+            logger.error(f"prometheus 查询失败: {params.get('query')}  {str(e)}")
+            return []
+
+        if body.get("status") != "success":
+            logger.error(f"prometheus 查询失败: {params.get('query')}  {body.get('error')}")
+            return []
+
+        self.cache[key] = body["data"]["result"]
+        return self.cache[key]
+
+    def query_range(self, query: str, start: float, end: float) -> list:
+        return self.request("query_range", {"query": self.expr(query, start, end), "start": start, "end": end,
+                                            "step": self.step})
+
+    def query(self, query: str, start: float, end: float) -> list:
+        return self.request("query", {"query": self.expr(query, start, end), "time": end})
+
+    def collect(self):
+        """
+        按测试时间窗口并发执行所有查询，同一个窗口只收集一次
+        """
+        if not self.status:
+            return
+
+        start, end = self.window()
+        start, end = round(start, 3), round(end or time.time(), 3)
+        if self.collected == (start, end):
+            return
+
+        extras = self.config.get("queries") or []
+        tasks = [(self.query_range, self.queries["cpu"]), (self.query_range, self.queries["mem"]),
+                 (self.query, self.queries["restarts"]), (self.query, self.queries["quota"])]
+        tasks.extend((self.query, self.queries[name]) for name in ("cpu.requests", "cpu.limits", "mem.requests",
+                                                                  "mem.limits"))
+        tasks.extend((self.query_range, self.queries[name]) for name in ("events.restarts", "events.oom",
+                                                                        "events.ready", "events.scale"))
+        tasks.extend((self.query_range, item["expr"]) for item in extras)
+
+        results = Pool(self.concurrency).map(lambda task: task[0](task[1], start, end), tasks)
+        cpu, mem, restarts, quota, *results = results
+        quotas, (restart_series, oom_series, ready_series, scale_series), results = \
+            results[:4], results[4:8], results[8:]
+
+        # pod 配额，没有配额指标的 pod 记为 0
+        pods = {}
+        for column, result in enumerate(quotas):
+            for series in result:
+                labels = series["metric"]
+                line = pods.setdefault(labels.get("container"), {}).setdefault(labels.get("pod"), [0.0] * 4)
+                line[column] = round(float(series["value"][1]), 3)
+
+        for metric, result in (("cpu", cpu), ("mem", mem)):
+            for series in result:
+                pods.setdefault(series["metric"].get("container"), {}).setdefault(series["metric"].get("pod"),
+                                                                                    [0.0] * 4)
+
+        pods.pop(None, None)
+        self.service_quotas = {"POD": pods, "SERVICE": self.merge_quotas(pods)}
+
+        # 按时间戳整理为行，写入共享时间索引的列式存储
+        rows = {}
+        for metric, result in (("cpu", cpu), ("mem", mem)):
+            for series in result:
+                service, pod = series["metric"].get("container"), series["metric"].get("pod")
+                if service not in pods:
+                    continue
+
+                for timestamp, value in series["values"]:
+                    row = rows.setdefault(timestamp, {})
+                    row[("POD", service, pod, metric)] = float(value)
+                    key = ("SERVICE", service, metric)
+                    row[key] = row.get(key, 0.0) + float(value)
+
+        self.usage = Frame(capacity=max(len(rows), 1))
+        for timestamp in sorted(rows):
+            self.usage.append(float(timestamp), list(rows[timestamp]), list(rows[timestamp].values()))
+
+        self.restart = {}
+        for series in restarts:
+            labels = series["metric"]
+            self.restart.setdefault(labels.get("container"), {})[labels.get("pod")] = round(float(series["value"][1]))
+
+        self.quota = quota
+        self.extras = list(zip(extras, results))
+
+        # 由指标序列的变化还原事件
+        def arrays(series: dict) -> tuple:
+            return [float(t) for t, _ in series["values"]], [float(v) for _, v in series["values"]]
+
+        oom = {(series["metric"].get("container"), series["metric"].get("pod")): dict(zip(*arrays(series)))
+               for series in oom_series}
+        self.timeline = EventTimeline()
+        for series in restart_series:
+            labels = series["metric"]
+            target = (labels.get("container"), labels.get("pod"))
+            for timestamp, _, _, detail in EventTimeline.edges(f"{target[1]}/{target[0]}", *arrays(series), "restart"):
+                kind = "oom" if oom.get(target, {}).get(timestamp) == 1 else "restart"
+                self.timeline.add(timestamp, kind, f"{target[1]}/{target[0]}", detail)
+
+        for series in ready_series:
+            self.timeline.events.extend(EventTimeline.edges(series["metric"].get("pod"), *arrays(series)))
+
+        for series in scale_series:
+            self.timeline.events.extend(EventTimeline.edges(series["metric"].get("horizontalpodautoscaler"),
+                                                            *arrays(series), "scale"))
+        self.collected = (start, end)
+
+    def restarts(self) -> dict:
+        self.collect()
+        return self.restart
+
+    def replica_sets(self) -> dict:
+        # 副本集与容器的对应关系需要 k8s 接口，这里不提供
+        return {}
+
+    @property
+    def namespace_resource(self):
+        """
+        命名空间资源配额(kube_resourcequota)
+        """
+        table = {
+            "title": "环境资源配置",
+            "heads": ["命名空间", "分类", "cpu.requests", "cpu.limits", "mem.requests", "mem.limits"]
+        }
+
+        self.collect()
+        values = {}
+        for series in self.quota:
+            labels = series["metric"]
+            value = float(series["value"][1])
+            if "memory" in labels.get("resource", ""):
+                value /= 1024 ** 3
+            values.setdefault(labels.get("type"), {})[labels.get("resource")] = round(value, 3)
+
+        lines = []
+        for kind, name in (("hard", "资源总量"), ("used", "当前使用")):
+            if kind in values:
+                lines.append([self.namespace, name] + [values[kind].get(resource, "-") for resource in
+                                                       ("requests.cpu", "limits.cpu", "requests.memory", "limits.memory")])
+
+        table["lines"] = lines
+        return table
+
+    @property
+    def service_resource(self):
+        self.collect()
+        return super().service_resource
+
+    @property
+    def pod_resource(self):
+        self.collect()
+        return super().pod_resource
+
+    def record_usage(self):
+        pass
+
+    @property
+    def events(self) -> list:
+        self.collect()
+        return super().events
+
+    def usage_summary(self, start: float = None, end: float = None) -> list:
+        self.collect()
+        return super().usage_summary(start, end)
+
+    @property
+    def cpu_percent(self) -> Optional[float]:
+        # 测试过程中没有数据
+        return None
+
+    @property
+    def service_usage_charts(self) -> list:
         """
-        result = {}
-        for service in data:
-            line = None
-            for pod_values in data[service].values():
-                if not line:
-                    line = [val for val in pod_values]
+        微服务资源使用图表，以及配置中自定义查询的图表
+        """
+        self.collect()
+        charts = super().service_usage_charts
+
+        names = []
+        jobs = []
+        for item, result in self.extras:
+            times = sorted({float(timestamp) for series in result for timestamp, _ in series["values"]})
+            if not times:
+                continue
+
+            index = {timestamp: idx for idx, timestamp in enumerate(times)}
+            y_axis = []
+            for series in result:
+                values = [float("nan")] * len(times)
+                for timestamp, value in series["values"]:
+                    values[index[float(timestamp)]] = float(value)
+
+                labels = series["metric"]
+                legend = labels.get(item.get("legend")) if item.get("legend") else None
+                y_axis.append((legend or ",".join(f"{k}={v}" for k, v in labels.items()) or item["name"], values))
+
+            names.append(item["name"])
+            jobs.append({"x_axis": times, "y_axis": y_axis, "title": item.get("title", item["name"]),
+                         "y_label": item.get("y_label")})
+
+        return charts + draw_many(names, jobs) if jobs else charts
+
+
+class ProcessMonitor:
+    """
+    主机进程资源信息
+    非 k8s 部署(虚拟机、本机)的被测服务，直接读取 /proc 采样进程的 CPU、内存、线程数、文件描述符、上下文切换及 IO，
+    只能监控主节点所在主机上的进程。进程的 /proc 文件打开后保持，每次采样只做 pread，亚秒级采样的开销很小。
+    进程按目标匹配，目标的写法:
+        pid:1234         指定进程号
+        name:正则        匹配进程名或命令行
+        cgroup:子串      匹配 /proc/PID/cgroup 中的路径，如容器 id、systemd 服务名
+    每个目标相当于一个微服务、匹配到的进程相当于 pod，输出与 KubernetesMonitor 相同用途的表格及图表
+    """
+
+    # 实例状态，默认不可用
+    status = False
+
+    # 重新匹配进程的间隔(s)，发现新启动的进程
+    discover = 5
+
+    # 保持打开的 /proc 文件
+    files = ("stat", "statm", "status", "io")
+
+    def __init__(self, targets: list = None, interval: float = 0.5):
+        """
+        :param targets: 目标列表
+        :param interval: 采样间隔(s)
+        """
+        self.targets = {}
+        for target in targets or []:
+            kind, _, pattern = target.partition(":")
+            if kind not in ("pid", "name", "cgroup") or not pattern or (kind == "pid" and not pattern.isdigit()):
+                raise RuntimeError(f"进程监控目标格式错误  {target}")
+
+            if kind == "pid":
+                pattern = int(pattern)
+            elif kind == "name":
+                pattern = re.compile(pattern)
+            self.targets[target] = (kind, pattern)
+
+        if not self.targets:
+            return
+
+        if not os.path.isdir("/proc"):
+            logger.error("当前系统没有 /proc，进程监控不可用")
+            return
+
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page = os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        self.cores = os.cpu_count() or 1
+        with open("/proc/meminfo") as f:
+            self.memory = round(int(f.readline().split()[1]) / 1024 / 1024, 3)
+
+        # 正在监控的进程 {pid: {"target", "command", "fds": {文件: fd}, "last": 上一次的累计值}}
+        self.processes = {}
+        self.discovered = 0
+
+        # 资源使用，共享时间索引的列式存储
+        # 列名 ("SERVICE", 目标, 指标) / ("POD", 目标, pid, 指标)
+        # 指标: cpu(核) rss(MB) threads fds ctx(次/s) read/write(KB/s)
+        self.usage = Frame()
+
+        # 进程启动、退出事件
+        self.timeline = EventTimeline()
+
+        self.status = True
+        self.scan(initial=True)
+
+        # 添加监控任务
+        ScheduleJob.add_job(self.record_usage, interval=interval)
+
+    def match(self, pid: int) -> Optional[str]:
+        """
+        进程匹配的第一个目标
+        """
+        command = None
+        for target, (kind, pattern) in self.targets.items():
+            if kind == "pid":
+                if pattern == pid:
+                    return target
+                continue
+
+            # 名字、cgroup 匹配时排除施压进程自身
+            if pid == os.getpid():
+                continue
+
+            try:
+                if kind == "name":
+                    if command is None:
+                        command = self.command(pid)
+                    if pattern.search(command):
+                        return target
                 else:
-                    for idx in range(len(line)):
-                        line[idx] = KubernetesMonitor.operate_quota(line[idx], pod_values[idx], "+")
+                    with open(f"/proc/{pid}/cgroup") as f:
+                        if pattern in f.read():
+                            return target
+            except OSError:
+                return None
+
+        return None
+
+    @staticmethod
+    def command(pid: int) -> str:
+        with open(f"/proc/{pid}/comm") as f:
+            name = f.read().strip()
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ").decode(errors="replace").strip()
 
-            result[service] = line
+        return " ".join(f"{name} {cmdline}".split())
 
-        return result
+    def scan(self, initial: bool = False):
+        """
+        匹配新进程并打开其 /proc 文件
+        """
+        self.discovered = time.time()
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit() or int(entry) in self.processes:
+                continue
+
+            pid = int(entry)
+            target = self.match(pid)
+            if not target:
+                continue
+
+            fds = {}
+            for name in self.files:
+                try:
+                    fds[name] = os.open(f"/proc/{pid}/{name}", os.O_RDONLY)
+                except OSError:
+                    # io 需要与目标进程相同的用户或更高权限
+                    fds[name] = None
+
+            if fds["stat"] is None:
+                continue
+
+            try:
+                command = self.command(pid)
+            except OSError:
+                command = str(pid)
+
+            self.processes[pid] = {"target": target, "command": command[:120], "fds": fds, "last": None}
+            if not initial:
+                self.timeline.add(time.time(), "created", f"{target} {pid}", command[:60])
+
+    def release(self, pid: int):
+        """
+        进程退出，关闭文件
+        """
+        process = self.processes.pop(pid)
+        for fd in process["fds"].values():
+            if fd is not None:
+                os.close(fd)
+
+        self.timeline.add(time.time(), "deleted", f"{process['target']} {pid}", process["command"][:60])
+
+    @staticmethod
+    def read(fd: int) -> bytes:
+        return os.pread(fd, 8192, 0)
+
+    def sample(self, pid: int, process: dict) -> list:
+        """
+        读取进程的累计值
+        :return: [时间, cpu ticks, rss(MB), 线程数, fd 数, 上下文切换次数, 读字节, 写字节]
+        """
+        fds = process["fds"]
+        now = time.time()
+
+        # stat 中进程名可能带空格，从最后一个 ")" 之后按空格切分
+        stat = self.read(fds["stat"])
+        fields = stat[stat.rindex(b")") + 2:].split()
+        ticks, threads = int(fields[11]) + int(fields[12]), int(fields[17])
+
+        rss = int(self.read(fds["statm"]).split()[1]) * self.page
+
+        ctx = 0
+        for line in self.read(fds["status"]).splitlines():
+            if b"ctxt_switches" in line:
+                ctx += int(line.split()[1])
+
+        read_bytes = write_bytes = float("nan")
+        if fds["io"] is not None:
+            try:
+                for line in self.read(fds["io"]).splitlines():
+                    if line.startswith(b"rchar:"):
+                        read_bytes = int(line.split()[1])
+                    elif line.startswith(b"wchar:"):
+                        write_bytes = int(line.split()[1])
+            except PermissionError:
+                pass
+
+        try:
+            files = len(os.listdir(f"/proc/{pid}/fd"))
+        except PermissionError:
+            files = float("nan")
+
+        return [now, ticks, rss, threads, files, ctx, read_bytes, write_bytes]
+
+    def record_usage(self):
+        """
+        采样所有进程，累计值换算为速率后写入时序存储
+        """
+        if not self.status:
+            return
+
+        if time.time() - self.discovered >= self.discover:
+            self.scan()
+
+        keys, values = [], []
+        services = {}
+        for pid, process in list(self.processes.items()):
+            try:
+                current = self.sample(pid, process)
+            except (OSError, ValueError, IndexError):
+                self.release(pid)
+                continue
+
+            last, process["last"] = process["last"], current
+            if last is None:
+                continue
+
+            elapsed = current[0] - last[0]
+            if elapsed <= 0:
+                continue
+
+            target = process["target"]
+            metrics = {
+                "cpu": (current[1] - last[1]) / self.ticks / elapsed,
+                "rss": current[2],
+                "threads": current[3],
+                "fds": current[4],
+                "ctx": (current[5] - last[5]) / elapsed,
+                "read": (current[6] - last[6]) / 1024 / elapsed,
+                "write": (current[7] - last[7]) / 1024 / elapsed
+            }
+
+            total = services.setdefault(target, dict.fromkeys(metrics, 0.0))
+            for metric, value in metrics.items():
+                keys.append(("POD", target, pid, metric))
+                values.append(value)
+                total[metric] += value
+
+        for target, metrics in services.items():
+            for metric, value in metrics.items():
+                keys.append(("SERVICE", target, metric))
+                values.append(value)
+
+        if keys:
+            self.usage.append(round(time.time(), 3), keys, values)
+
+    def close(self):
+        for pid in list(getattr(self, "processes", {})):
+            process = self.processes.pop(pid)
+            for fd in process["fds"].values():
+                if fd is not None:
+                    os.close(fd)
+
+    def pids(self, target: str) -> list:
+        """
+        目标下有过采样的进程
+        """
+        return sorted({key[2] for key in self.usage.index if key[0] == "POD" and key[1] == target})
+
+    @property
+    def namespace_resource(self):
+        """
+        主机资源
+        """
+        load = os.getloadavg()
+        return {
+            "title": "主机资源",
+            "heads": ["主机", "CPU核数", "内存(G)", "1分钟负载", "5分钟负载", "15分钟负载"],
+            "lines": [[socket.gethostname(), self.cores, self.memory] + [round(value, 2) for value in load]]
+        }
+
+    @property
+    def service_resource(self):
+        """
+        各目标的资源汇总
+        """
+        table = {
+            "title": "进程目标资源",
+            "heads": ["目标", "进程数", "平均CPU(核)", "最大CPU(核)", "平均RSS(MB)", "最大RSS(MB)", "最大线程数", "最大fd数"]
+        }
+
+        lines = []
+        for target in self.targets:
+            avg, peak = self.usage.summary([("SERVICE", target, metric) for metric in ("cpu", "rss", "threads", "fds")])
+            lines.append([target, len(self.pids(target))] +
+                         self.rounded(avg[0], peak[0], avg[1], peak[1], peak[2], peak[3]))
+
+        table["lines"] = lines
+        return table
+
+    @property
+    def pod_resource(self):
+        """
+        各进程的资源汇总
+        """
+        table = {
+            "title": "进程资源",
+            "heads": ["目标", "PID", "命令", "平均CPU(核)", "最大CPU(核)", "平均RSS(MB)", "最大RSS(MB)", "最大线程数",
+                      "最大fd数", "上下文切换(次/s)", "IO读(KB/s)", "IO写(KB/s)"]
+        }
+
+        commands = {pid: process["command"] for pid, process in self.processes.items()}
+        metrics = ("cpu", "rss", "threads", "fds", "ctx", "read", "write")
+        lines = []
+        for target in self.targets:
+            for pid in self.pids(target):
+                avg, peak = self.usage.summary([("POD", target, pid, metric) for metric in metrics])
+                lines.append([target, pid, commands.get(pid, "(已退出)")] +
+                             self.rounded(avg[0], peak[0], avg[1], peak[1], peak[2], peak[3], avg[4], avg[5], avg[6]))
+
+        table["lines"] = lines
+        return table
+
+    @staticmethod
+    def rounded(*values) -> list:
+        return [round(float(value), 3) if not np.isnan(value) else "-" for value in values]
+
+    def usage_summary(self, start: float = None, end: float = None) -> list:
+        """
+        各目标在时间范围内的资源使用汇总，格式同 KubernetesMonitor.usage_summary，limits 取主机的核数及内存
+        :return: [(目标, 平均CPU, 最大CPU, 平均内存, 最大内存, CPU limits, 内存 limits), ...]  CPU 单位核，内存单位G
+        """
+        lines = []
+        for target in self.targets:
+            avg, peak = self.usage.summary([("SERVICE", target, "cpu"), ("SERVICE", target, "rss")], start, end)
+            if np.isnan(avg[0]):
+                continue
+
+            lines.append((target, round(float(avg[0]), 3), round(float(peak[0]), 3), round(float(avg[1]) / 1024, 3),
+                          round(float(peak[1]) / 1024, 3), self.cores, self.memory))
+
+        return lines
+
+    @property
+    def cpu_percent(self) -> Optional[float]:
+        """
+        最近一次采样中，各目标 CPU 使用量占主机核数百分比的最大值
+        """
+        usage = self.usage.last([("SERVICE", target, "cpu") for target in self.targets])
+        if np.isnan(usage).all():
+            return None
+
+        return round(float(np.nanmax(usage)) / self.cores * 100, 3)
+
+    @property
+    def events(self) -> list:
+        return sorted(self.timeline.events)
+
+    @property
+    def service_usage_charts(self) -> list:
+        """
+        各目标的资源使用图表
+        CPU、RSS 每个进程一条折线；线程及 fd、上下文切换、IO 为目标的合计
+        """
+        charts = [("CPU", "cpu use percent", "cpu", 100), ("RSS", "rss(MB)", "rss", 1)]
+        totals = [("线程/fd", "count", ("threads", "fds")), ("上下文切换", "switches/s", ("ctx",)),
+                  ("IO", "KB/s", ("read", "write"))]
+
+        names = []
+        jobs = []
+        for target in self.targets:
+            pids = self.pids(target)
+            if not pids:
+                continue
+
+            for title, y_label, metric, scale in charts:
+                keys = [("SERVICE", target, metric)] + [("POD", target, pid, metric) for pid in pids]
+                times, matrix = self.usage.read(keys, "max")
+                matrix = np.round(matrix * scale, 3)
+                y_axis = [(target, matrix[:, 0].tolist())] + [(str(pid), matrix[:, idx + 1].tolist())
+                                                               for idx, pid in enumerate(pids)]
+                names.append(f"{target} ({title})")
+                jobs.append({"x_axis": times.tolist(), "y_axis": y_axis, "title": f"{target} {title}",
+                             "y_label": y_label})
+
+            for title, y_label, metrics in totals:
+                times, matrix = self.usage.read([("SERVICE", target, metric) for metric in metrics], "max")
+                matrix = np.round(matrix, 3)
+                names.append(f"{target} ({title})")
+                jobs.append({"x_axis": times.tolist(), "y_axis": [(metric, matrix[:, idx].tolist())
+                                                                  for idx, metric in enumerate(metrics)],
+                             "title": f"{target} {title}", "y_label": y_label})
+
+        return draw_many(names, jobs) if jobs else []
 
 
 class LocalMonitor:
@@ -558,8 +1240,14 @@ class LocalMonitor:
     def __init__(self, environment):
         self.environment = environment
 
-        # 统计对象
-        self.metrics = {}
+        # 统计对象，定长的时序存储，长时间运行内存不增长
+        self.metrics = TimeSeries(["rps", "fps", "50%ile", "90%ile", "100%ile"])
+
+        # 图表绘制函数，可替换为在旁路进程中绘制
+        self.render = chart
+
+        # 标注在图表上的事件 [(时间戳, 类型, 对象, 详情), ...]
+        self.events = []
 
     def record_metrics(self):
         """
@@ -568,12 +1256,13 @@ class LocalMonitor:
         """
         # 记录动态值
         total = self.environment.stats.total
-        self.metrics.setdefault("time", []).append(round(time.time(), 2))
-        self.metrics.setdefault("rps", []).append(round(total.current_rps, 1))
-        self.metrics.setdefault("fps", []).append(round(total.current_fail_per_sec, 1))
-        self.metrics.setdefault("50%ile", []).append(total.get_current_response_time_percentile(0.5) or 0)
-        self.metrics.setdefault("90%ile", []).append(total.get_current_response_time_percentile(0.9) or 0)
-        self.metrics.setdefault("100%ile", []).append(total.get_current_response_time_percentile(1) or 0)
+        self.metrics.append(round(time.time(), 2), [
+            round(total.current_rps, 1),
+            round(total.current_fail_per_sec, 1),
+            total.get_current_response_time_percentile(0.5) or 0,
+            total.get_current_response_time_percentile(0.9) or 0,
+            total.get_current_response_time_percentile(1) or 0
+        ])
 
     @property
     def rps_chart(self) -> Optional[tuple]:
@@ -585,9 +1274,8 @@ class LocalMonitor:
         x_axis = self.metrics["time"]
         y_axis = [("rps", self.metrics["rps"]), ("fail/s", self.metrics["fps"])]
 
-        rps_chart = chart(x_axis, y_axis, title=title, y_label="requests/s")
-
-        return title, Dynamic.random_str(12), MIMEImage(rps_chart)
+        return draw(title, render=self.render, x_axis=x_axis, y_axis=y_axis, title=title, y_label="requests/s",
+                    events=self.events)
 
     @property
     def response_time_chart(self) -> Optional[tuple]:
@@ -597,9 +1285,16 @@ class LocalMonitor:
         """
         title = "Response Time"
         x_axis = self.metrics["time"]
-        y_axis = [("50%ile", self.metrics["50%ile"]), ("90%ile", self.metrics["90%ile"]),
-                  ("100%ile", self.metrics["100%ile"])]
+        # 汇总层的分位值取最大值，避免平均后掩盖毛刺
+        y_axis = [(name, self.metrics.read(name, "max")[1]) for name in ("50%ile", "90%ile", "100%ile")]
 
-        response_time_chart = chart(x_axis, y_axis, title=title, y_label="percentile(ms)")
+        return draw(title, render=self.render, x_axis=x_axis, y_axis=y_axis, title=title, y_label="percentile(ms)",
+                    events=self.events)
 
-        return title, Dynamic.random_str(12), MIMEImage(response_time_chart)
+    def anomalies(self, column: str = "90%ile") -> list:
+        """
+        响应时间异常段
+        :return: [(开始时间, 结束时间, 峰值, 基线), ...]
+        """
+        times, values = self.metrics.read(column, "max")
+        return anomalies(times, values)
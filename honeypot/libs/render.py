@@ -0,0 +1,368 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import base64
+import gevent
+import jinja2
+import numpy as np
+
+from typing import Optional, Tuple, List, Callable
+from gevent import subprocess
+from email.mime.image import MIMEImage
+
+from honeypot import BASE_DIR, REPORT_DIR
+from honeypot.libs.cio import send, receive
+from honeypot.libs.utils import logger
+from honeypot.libs.cfaker import Dynamic
+from honeypot.libs.events import EventTimeline
+
+# 按画布尺寸复用的画布，避免每张图表都创建新的 Figure
+figures = {}
+
+
+def downsample(x_axis, y_axis, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    保留极值的降采样
+    将数据等分为 points / 2 个桶，每个桶保留最小值和最大值两个点，尖峰不会被平均掉
+    :param x_axis: x 轴的值
+    :param y_axis: y 轴的值，与 x 轴等长
+    :param points: 降采样后最多保留的点数
+    :return: (x, y)
+    """
+    x = np.asarray(x_axis, dtype=float)
+    y = np.asarray(y_axis, dtype=float)
+
+    buckets = points // 2
+    if len(y) <= points or buckets < 1:
+        return x, y
+
+    size = math.ceil(len(y) / buckets)
+    rows = math.ceil(len(y) / size)
+    grid = np.pad(y, (0, rows * size - len(y)), constant_values=np.nan).reshape(rows, size)
+
+    # 每个桶内最小值、最大值的位置，按时间顺序排列并去重
+    # 全为 NaN 的桶(如测试中途启动的 pod)保留桶内第一个点，图上留下断点
+    missing = np.isnan(grid)
+    empty = missing.all(axis=1)
+    low = np.where(empty, 0, np.argmin(np.where(missing, np.inf, grid), axis=1))
+    high = np.where(empty, 0, np.argmax(np.where(missing, -np.inf, grid), axis=1))
+    base = np.arange(rows) * size
+    index = np.sort(np.stack([base + low, base + high], axis=1), axis=1)
+    index = index.ravel()
+    index = index[np.r_[True, np.diff(index) != 0]]
+
+    return x[index], y[index]
+
+
+def figure_of(fig_size: Tuple[int, int]):
+    """
+    获取指定尺寸的画布并清空。不经过 pyplot，画布不会注册到全局，用完即可回收
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = figures.get(tuple(fig_size))
+    if figure is None:
+        figure = figures[tuple(fig_size)] = Figure(figsize=fig_size, dpi=100)
+        FigureCanvasAgg(figure)
+
+    figure.clear()
+    return figure
+
+
+def chart(x_axis: list, y_axis: Optional[Tuple[str, list] or List[Tuple[str, list]]],
+          fig_size: Tuple[int, int] = (16, 7), title=None, x_axis_point: int = 64,
+          x_label=None, y_label=None, grid=True, points=4320, x_time=True, events: list = None) -> bytes:
+    """
+    绘制折线图
+    :param x_axis: x 轴的值，要求是秒级时间戳
+    :param y_axis: y 轴的值，要求是多组数据，每一组对应一个折线
+    :param fig_size: 画布的尺寸比例
+    :param title: 图表标题
+    :param x_axis_point: x 轴坐标的点数，即控制 x 轴坐标显示的密度
+    :param x_label: x 轴标签
+    :param y_label: y 轴标签
+    :param grid: 是否画网格
+    :param points: 每条折线最大的坐标点数，超出时按极值降采样
+    :param x_time: x 轴是否为时间戳，为 False 时 x 轴的值直接作为坐标文本
+    :param events: 标注在图上的事件 [(时间戳, 类型, 对象, 详情), ...]，只用于时间轴
+    :return: PNG 图片内容
+    """
+    from matplotlib import ticker
+
+    # 准备曲线颜色，准备12种颜色对比明显的
+    colors = ["#00AA00", "#778899", "#CC6600", "#0088A8", "#990099", "#BBBB00"]
+
+    if not x_axis or not y_axis:
+        logger.warning("图表绘制异常，请检查参数 x_axis、y_axis")
+        raise RuntimeError("图表绘制异常，请检查参数 x_axis、y_axis")
+
+    figure = figure_of(fig_size)
+    axis = figure.add_subplot()
+
+    # 时间戳直接作为数值坐标，其它 x 值以序号作为坐标。只在绘制刻度时格式化文本
+    if x_time:
+        x_values = x_axis
+        axis.xaxis.set_major_locator(ticker.MaxNLocator(nbins=x_axis_point))
+        axis.xaxis.set_major_formatter(ticker.FuncFormatter(
+            lambda value, _: time.strftime("%d %H:%M:%S", time.localtime(value))))
+    else:
+        labels = [str(x) for x in x_axis]
+        x_values = range(len(labels))
+        axis.xaxis.set_major_locator(ticker.MultipleLocator(math.ceil(len(labels) / x_axis_point)))
+        axis.xaxis.set_major_formatter(ticker.FuncFormatter(
+            lambda value, _: labels[int(value)] if 0 <= value < len(labels) and value == int(value) else ""))
+
+    for idx in range(len(y_axis)):
+        # 如果x轴和y轴值个数不同就不绘制
+        if len(x_axis) != len(y_axis[idx][1]):
+            continue
+
+        x_cur, y_cur = downsample(x_values, y_axis[idx][1], points)
+
+        line_style = "dashed" if idx else "solid"
+        axis.plot(x_cur, y_cur, linestyle=line_style, linewidth=1.2,
+                  marker='', label=y_axis[idx][0], color=colors[idx % len(colors)])
+
+    # 事件以竖线标注，类型写在图的顶部
+    if x_time and events:
+        top = axis.get_ylim()[1]
+        for timestamp, kind, target, _ in events:
+            if not x_axis[0] <= timestamp <= x_axis[-1]:
+                continue
+
+            color = EventTimeline.colors.get(kind, "#999999")
+            axis.axvline(timestamp, color=color, linestyle=":", linewidth=1, alpha=0.8)
+            axis.text(timestamp, top, f"{kind} {target}", color=color, fontsize=7, rotation=90,
+                      verticalalignment="top", horizontalalignment="right")
+
+    # 设置 x 轴最左刻度和最右刻度
+    axis.set_xlim(auto=True)
+
+    # 设置 x 坐标轴刻度的旋转方向和大小，x 轴通常是时间，为了避免重叠问题，将文本纵向展示
+    axis.tick_params(axis="x", labelrotation=90, labelsize=8)
+
+    # 显示图例
+    axis.legend(loc=2, fontsize=10)
+
+    # 显示网格
+    if grid:
+        axis.grid(True, linestyle='--', alpha=0.7)
+
+    # 图片、X轴、Y轴的标签
+    if x_label:
+        axis.set_xlabel(x_label, fontsize=12)
+    if y_label:
+        axis.set_ylabel(y_label, fontsize=12)
+    if title:
+        axis.set_title(title, fontsize=14)
+
+    # 紧凑布局
+    figure.tight_layout()
+
+    # 获取图像流
+    buffer = io.BytesIO()
+    figure.canvas.print_png(buffer)
+    stream = buffer.getvalue()
+
+    # 清理缓存，画布留给下一张图表复用
+    buffer.close()
+    figure.clear()
+
+    return stream
+
+
+class RenderPool:
+    """
+    图表渲染进程池
+    matplotlib 绘图是纯 CPU 计算，图表较多时(如每个微服务两张)在多个子进程中并行绘制。
+    子进程通过标准输入输出上的长度前缀帧收发绘图参数及 PNG 内容，父进程用协程等待，不阻塞施压
+    """
+
+    # 子进程入口
+    bootstrap = "from honeypot.libs.render import serve; serve()"
+
+    def __init__(self, size: int = None):
+        self.size = size or min(os.cpu_count() or 1, 8)
+
+    def render(self, jobs: List[dict]) -> List[bytes]:
+        """
+        按顺序返回每个绘图任务的 PNG 内容
+        :param jobs: chart 的关键字参数列表
+        """
+        size = min(self.size, len(jobs))
+        if size <= 1:
+            return [chart(**job) for job in jobs]
+
+        results = [None] * len(jobs)
+
+        # 框架目录加在用户原有的 PYTHONPATH 之前
+        path = os.pathsep.join(filter(None, [BASE_DIR, os.environ.get("PYTHONPATH")]))
+
+        def worker(offset: int):
+            process = subprocess.Popen([sys.executable, "-c", self.bootstrap],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       env={**os.environ, "PYTHONPATH": path})
+            try:
+                for idx in range(offset, len(jobs), size):
+                    send(process.stdin, jobs[idx])
+                    reply = receive(process.stdout)
+                    if not reply or "error" in reply:
+                        raise RuntimeError(f"图表绘制失败: {(reply or {}).get('error')}")
+
+                    results[idx] = reply["image"]
+            finally:
+                process.stdin.close()
+                process.wait()
+
+        gevent.joinall([gevent.spawn(worker, offset) for offset in range(size)], raise_error=True)
+
+        return results
+
+
+class Canvas:
+    """
+    图表输出格式
+        png   服务端绘制为图片，嵌入邮件
+        html  不绘制图片，保留图表数据，由交互式 HTML 报告在浏览器中绘制
+    """
+    format = "png"
+
+
+def draw(name: str, render: Callable = chart, **kwargs) -> tuple:
+    """
+    生成报告使用的图表元组 (名字, ID, 图表)
+    png 格式下图表为邮件图片对象，html 格式下为 chart 的参数
+    :param name: 图表名字
+    :param render: 绘图函数，参数同 chart
+    :param kwargs: chart 的参数
+    """
+    if Canvas.format == "html":
+        return name, Dynamic.random_str(12), kwargs
+
+    return name, Dynamic.random_str(12), MIMEImage(render(**kwargs))
+
+
+def draw_many(names: List[str], jobs: List[dict]) -> List[tuple]:
+    """
+    批量生成图表元组，png 格式下通过进程池并行绘制
+    """
+    if Canvas.format == "html":
+        return [(name, Dynamic.random_str(12), job) for name, job in zip(names, jobs)]
+
+    return [(name, Dynamic.random_str(12), MIMEImage(image)) for name, image in zip(names, RenderPool().render(jobs))]
+
+
+def encode(spec: dict) -> dict:
+    """
+    压缩编码图表数据
+    x 轴(时间戳按 0.01s，其它按序号)及每条折线(按 0.001)量化为整数后差分，
+    拼接为小端 int32 数组并以 zlib 压缩、base64 编码，浏览器端用 DecompressionStream("deflate") 解压
+    """
+    x_axis = spec["x_axis"]
+    x_time = spec.get("x_time", True)
+    lines = [(name, values) for name, values in spec["y_axis"] if len(values) == len(x_axis)]
+
+    if x_time:
+        columns = [np.round((np.asarray(x_axis, dtype=float) - x_axis[0]) * 100)]
+    else:
+        columns = [np.arange(len(x_axis), dtype=float)]
+    columns.extend(np.round(np.nan_to_num(np.asarray(values, dtype=float)) * 1000) for _, values in lines)
+
+    limit = np.iinfo(np.int32)
+    deltas = [np.clip(np.diff(column, prepend=0), limit.min, limit.max) for column in columns]
+    data = np.concatenate(deltas).astype("<i4").tobytes()
+
+    return {
+        "title": spec.get("title"),
+        "x_label": spec.get("x_label"),
+        "y_label": spec.get("y_label"),
+        "x0": x_axis[0] if x_time else 0,
+        "labels": None if x_time else [str(x) for x in x_axis],
+        "lines": [name for name, _ in lines],
+        "events": [[timestamp, EventTimeline.colors.get(kind, "#999999"), f"{kind} {target} {detail}".strip()]
+                   for timestamp, kind, target, detail in spec.get("events") or []
+                   if x_time and x_axis[0] <= timestamp <= x_axis[-1]],
+        "n": len(x_axis),
+        "data": base64.b64encode(zlib.compress(data, 9)).decode("ascii")
+    }
+
+
+def html_report(tables: list, charts: list, filename: str = "report.html", **kwargs) -> str:
+    """
+    生成单文件的交互式 HTML 报告，保存到报告目录
+    图表数据压缩后内嵌在页面中，由浏览器绘制为 SVG；已是图片的图表(如 grafana 截图)以 base64 内嵌
+    :param tables: 报告表格
+    :param charts: 图表元组列表
+    :return: 文件路径
+    """
+    items = []
+    for name, cid, content in charts:
+        if isinstance(content, dict):
+            series = json.dumps(encode(content), ensure_ascii=False).replace("</", "<\\/")
+            items.append({"name": name, "id": cid, "series": series})
+        else:
+            image = base64.b64encode(content.get_payload(decode=True)).decode("ascii")
+            items.append({"name": name, "id": cid, "image": image})
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(BASE_DIR, "honeypot", "templates")))
+    html = env.get_template("interactive_report.html").render(tables=tables, charts=items, **kwargs)
+
+    path = os.path.join(REPORT_DIR, filename)
+    with open(path, "w", encoding="utf8") as f:
+        f.write(html)
+
+    return path
+
+
+def serve():
+    """
+    渲染子进程主循环
+    """
+    # 标准输出留给通信，日志等输出改到标准错误
+    channel = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+
+    while True:
+        job = receive(sys.stdin.buffer)
+        if job is None:
+            break
+
+        try:
+            reply = {"image": chart(**job)}
+        except Exception as e:
+            reply = {"error": str(e)}
+
+        send(channel, reply)
+
+
+def benchmark(counts=(10, 40, 80), samples: int = 4320):
+    """
+    对比串行绘制与进程池绘制微服务资源图表的耗时
+    每个微服务两张图表(CPU、内存)，每张图表含微服务及 3 个 pod 的折线，采样点数默认为 6 小时每 5s 一次
+    python -m honeypot.libs.render
+    """
+    x_axis = list(np.arange(samples) * 5 + time.time() - samples * 5)
+    lines = [(f"pod-{idx}", list(np.random.rand(samples) * 100)) for idx in range(4)]
+
+    print(f"{'微服务数量':<10}{'串行(s)':>10}{'进程池(s)':>12}")
+    for count in counts:
+        jobs = [{"x_axis": x_axis, "y_axis": lines, "title": f"service-{idx}"} for idx in range(count * 2)]
+
+        begin = time.time()
+        RenderPool(1).render(jobs)
+        serial = time.time() - begin
+
+        begin = time.time()
+        RenderPool().render(jobs)
+        pool = time.time() - begin
+
+        print(f"{count:<15}{serial:>10.2f}{pool:>12.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,354 @@
+import numpy as np
+
+from array import array
+from typing import List, Tuple, Hashable
+
+
+class Ring:
+    """
+    定长环形缓冲区，每列一个预分配的 float64 数组
+    """
+
+    def __init__(self, columns: int, capacity: int):
+        self.capacity = capacity
+        self.columns = [array("d", bytes(8 * capacity)) for _ in range(columns)]
+        self.start = 0
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size == self.capacity
+
+    def push(self, values) -> tuple:
+        """
+        写入一行，缓冲区已满时返回被挤出的最旧一行
+        """
+        evicted = None
+        if self.full:
+            evicted = tuple(column[self.start] for column in self.columns)
+            position = self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            position = (self.start + self.size) % self.capacity
+            self.size += 1
+
+        for column, value in zip(self.columns, values):
+            column[position] = value
+
+        return evicted
+
+    def column(self, idx: int) -> List[float]:
+        """
+        按时间顺序返回一列
+        """
+        column = self.columns[idx]
+        end = self.start + self.size
+        if end <= self.capacity:
+            return column[self.start:end].tolist()
+
+        return column[self.start:].tolist() + column[:end - self.capacity].tolist()
+
+    def last(self, idx: int) -> float:
+        return self.columns[idx][(self.start + self.size - 1) % self.capacity]
+
+
+class TimeSeries:
+    """
+    定长内存的多列时序存储
+    原始层以环形缓冲区保存最近的采样点；被挤出原始层的采样按 factor 个一组汇总为 min/max/avg 桶，
+    写入下一层的环形缓冲区，逐层类推，最后一层写满后丢弃最旧的桶。
+    写入的时间复杂度为 O(1)，内存只取决于各层容量
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 3600, tiers: Tuple[Tuple[int, int], ...] = ((10, 2160), (6, 1440))):
+        """
+        :param columns: 列名
+        :param capacity: 原始层容量
+        :param tiers: 各汇总层的 (汇总因子, 容量)，汇总因子表示多少个上一层的数据汇总为一个桶
+        """
+        self.names = list(columns)
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        width = len(self.names)
+
+        # 原始层: 时间 + 各列的值
+        self.raw = Ring(1 + width, capacity)
+
+        # 汇总层: 时间和、样本数 + 各列的 min/max/sum
+        self.factors = [factor for factor, _ in tiers]
+        self.tiers = [Ring(2 + 3 * width, size) for _, size in tiers]
+
+        # 各汇总层正在累积的桶及其包含的上一层数据个数
+        self.pending = [None] * len(tiers)
+        self.filled = [0] * len(tiers)
+
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name: str) -> List[float]:
+        if name == "time":
+            return self.read("time")[0]
+
+        return self.read(name)[1]
+
+    def append(self, timestamp: float, values: list):
+        """
+        写入一个采样点
+        """
+        self.count += 1
+        evicted = self.raw.push([timestamp] + list(values))
+        if evicted is None:
+            return
+
+        # 原始采样转换为只含一个样本的桶
+        bucket = [evicted[0], 1]
+        for value in evicted[1:]:
+            bucket.extend((value, value, value))
+
+        self.rollup(0, bucket)
+
+    def rollup(self, level: int, bucket: list):
+        """
+        将一个桶合并到指定汇总层
+        """
+        if level >= len(self.tiers):
+            return
+
+        pending = self.pending[level]
+        if pending is None:
+            self.pending[level] = list(bucket)
+        else:
+            pending[0] += bucket[0]
+            pending[1] += bucket[1]
+            for idx in range(2, len(bucket), 3):
+                pending[idx] = min(pending[idx], bucket[idx])
+                pending[idx + 1] = max(pending[idx + 1], bucket[idx + 1])
+                pending[idx + 2] += bucket[idx + 2]
+
+        self.filled[level] += 1
+        if self.filled[level] < self.factors[level]:
+            return
+
+        full, self.pending[level], self.filled[level] = self.pending[level], None, 0
+        evicted = self.tiers[level].push(full)
+        if evicted is not None:
+            self.rollup(level + 1, list(evicted))
+
+    @staticmethod
+    def value(bucket, offset: int, agg: str) -> float:
+        count = bucket[1]
+        if agg == "min":
+            return bucket[offset]
+        if agg == "max":
+            return bucket[offset + 1]
+
+        return bucket[offset + 2] / count
+
+    def read(self, name: str, agg: str = "avg", start: float = None, end: float = None) -> Tuple[list, list]:
+        """
+        按时间顺序读取一列，较旧的数据来自汇总层
+        :param name: 列名，为 time 时只返回时间
+        :param agg: 汇总层取值方式 avg/min/max
+        :param start: 起始时间
+        :param end: 结束时间
+        :return: (时间列表, 值列表)
+        """
+        times, values = [], []
+        offset = 2 + 3 * self.index[name] if name != "time" else None
+
+        # 从最旧的汇总层开始读取，每层的已完成桶在前，累积中的桶在后
+        for level in range(len(self.tiers) - 1, -1, -1):
+            ring = self.tiers[level]
+            counts = ring.column(1)
+            times.extend(t / c for t, c in zip(ring.column(0), counts))
+            if offset is not None:
+                base = offset + (0 if agg == "min" else 1 if agg == "max" else 2)
+                column = ring.column(base)
+                values.extend(column if agg in ("min", "max") else [v / c for v, c in zip(column, counts)])
+
+            pending = self.pending[level]
+            if pending is not None:
+                times.append(pending[0] / pending[1])
+                if offset is not None:
+                    values.append(self.value(pending, offset, agg))
+
+        times.extend(self.raw.column(0))
+        if offset is not None:
+            values.extend(self.raw.column(1 + self.index[name]))
+
+        if start is not None or end is not None:
+            start = times[0] if start is None else start
+            end = times[-1] if end is None else end
+            pairs = [(t, v) for t, v in zip(times, values or times) if start <= t <= end]
+            times = [t for t, _ in pairs]
+            values = [v for _, v in pairs] if offset is not None else []
+
+        return times, values
+
+    def last(self, name: str) -> float:
+        """
+        最近一个采样点的值
+        """
+        return self.raw.last(1 + self.index[name])
+
+
+class Frame:
+    """
+    共享时间索引的列式时序存储
+    所有列共用一个时间列，数据保存在预分配的 float32 矩阵中(行为采样点，列为对象)，适合大量对象同频采样，
+    写入一行只有一次向量赋值，读取多列时直接切片，无需逐点遍历。
+    行数写满后相邻两行合并为一行(平均值按各单元格的样本数加权，峰值取最大值)，时间分辨率减半，内存只取决于行数和列数。
+    对象在某个采样点缺失时记为 NaN
+    """
+
+    def __init__(self, capacity: int = 2048, columns: int = 64):
+        """
+        :param capacity: 行数，写满后合并压缩
+        :param columns: 初始列数，不足时按倍数扩容
+        """
+        self.capacity = capacity
+        self.time = np.zeros(capacity)
+        self.weight = np.zeros(capacity)
+        self.mean = np.full((capacity, columns), np.nan, dtype=np.float32)
+        self.peak = np.full((capacity, columns), np.nan, dtype=np.float32)
+
+        # 各单元格合并的样本数，列稀疏时行的样本数不能代表单元格的样本数
+        self.counts = np.zeros((capacity, columns), dtype=np.uint32)
+
+        # 列名 -> 列号
+        self.index = {}
+
+        # 已使用的行数、写入的采样点数
+        self.size = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.index
+
+    def columns(self, keys: list) -> np.ndarray:
+        """
+        列名转换为列号，新列名分配列号，列数不足时扩容
+        """
+        for key in keys:
+            if key not in self.index:
+                self.index[key] = len(self.index)
+
+        width = self.mean.shape[1]
+        if len(self.index) > width:
+            grow = max(width, len(self.index) - width)
+            padding = np.full((self.capacity, grow), np.nan, dtype=np.float32)
+            self.mean = np.hstack([self.mean, padding])
+            self.peak = np.hstack([self.peak, padding])
+            self.counts = np.hstack([self.counts, np.zeros((self.capacity, grow), dtype=np.uint32)])
+
+        return np.fromiter((self.index[key] for key in keys), dtype=np.intp, count=len(keys))
+
+    def append(self, timestamp: float, keys: list, values: list):
+        """
+        写入一个采样点
+        :param keys: 本次采样的列名
+        :param values: 与列名一一对应的值
+        """
+        if self.size == self.capacity:
+            self.compact()
+
+        columns = self.columns(keys)
+        row = self.size
+        self.time[row] = timestamp
+        self.weight[row] = 1
+        self.mean[row, columns] = values
+        self.peak[row, columns] = values
+        self.counts[row, columns] = 1
+
+        self.size += 1
+        self.count += 1
+
+    def compact(self):
+        """
+        相邻两行合并，释放一半的行
+        """
+        pairs = self.size // 2
+        n = pairs * 2
+        wa, wb = self.weight[0:n:2], self.weight[1:n:2]
+        total = wa + wb
+
+        self.time[:pairs] = (self.time[0:n:2] * wa + self.time[1:n:2] * wb) / total
+
+        a, b = self.mean[0:n:2], self.mean[1:n:2]
+        ca, cb = self.counts[0:n:2], self.counts[1:n:2]
+        counts = ca + cb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged = (np.where(ca > 0, a, 0) * ca + np.where(cb > 0, b, 0) * cb) / counts
+        self.mean[:pairs] = np.where(counts > 0, merged, np.nan)
+        self.peak[:pairs] = np.fmax(self.peak[0:n:2], self.peak[1:n:2])
+        self.counts[:pairs] = counts
+        self.weight[:pairs] = total
+
+        # 行数为奇数时最后一行原样保留
+        if self.size > n:
+            self.time[pairs], self.weight[pairs] = self.time[n], self.weight[n]
+            self.mean[pairs], self.peak[pairs] = self.mean[n], self.peak[n]
+            self.counts[pairs] = self.counts[n]
+            pairs += 1
+
+        self.mean[pairs:self.size] = np.nan
+        self.peak[pairs:self.size] = np.nan
+        self.counts[pairs:self.size] = 0
+        self.weight[pairs:self.size] = 0
+        self.size = pairs
+
+    def window(self, start: float = None, end: float = None) -> slice:
+        """
+        时间范围对应的行
+        """
+        times = self.time[:self.size]
+        lo = 0 if start is None else int(np.searchsorted(times, start, "left"))
+        hi = self.size if end is None else int(np.searchsorted(times, end, "right"))
+        return slice(lo, hi)
+
+    def read(self, keys: list, agg: str = "avg", start: float = None, end: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        读取多列
+        :param keys: 列名，不存在的列全为 NaN
+        :param agg: 合并后的行取值方式 avg/max，count 为各单元格的样本数
+        :return: (时间数组, 矩阵)，矩阵的每一列对应一个列名
+        """
+        rows = self.window(start, end)
+        source = {"max": self.peak, "count": self.counts}.get(agg, self.mean)
+        exists = [key in self.index for key in keys]
+
+        matrix = np.full((rows.stop - rows.start, len(keys)), np.nan, dtype=np.float32)
+        if any(exists):
+            columns = np.fromiter((self.index[key] for key in keys if key in self.index), dtype=np.intp)
+            matrix[:, np.flatnonzero(exists)] = source[rows, columns]
+
+        return self.time[rows].copy(), matrix
+
+    def summary(self, keys: list, start: float = None, end: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        时间范围内各列的平均值(按样本数加权)及最大值，没有数据的列为 NaN
+        :return: (平均值数组, 最大值数组)
+        """
+        _, mean = self.read(keys, "avg", start, end)
+        _, peak = self.read(keys, "max", start, end)
+        _, counts = self.read(keys, "count", start, end)
+
+        weight = np.where(np.isnan(mean), 0, np.nan_to_num(counts))
+        total = weight.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = np.where(total > 0, np.nansum(mean * weight, axis=0) / total, np.nan)
+
+        return avg, np.fmax.reduce(peak, axis=0, initial=np.nan)
+
+    def last(self, keys: list) -> np.ndarray:
+        """
+        最近一个采样点的值
+        """
+        if not self.size:
+            return np.full(len(keys), np.nan)
+
+        return self.read(keys, start=self.time[self.size - 1])[1][-1]
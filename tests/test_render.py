@@ -0,0 +1,31 @@
+import numpy as np
+
+from honeypot.libs.render import downsample
+
+
+def test_downsample_keeps_extremes():
+    y = np.zeros(1000)
+    y[123], y[789] = 50, -50
+    x, values = downsample(np.arange(1000), y, 100)
+
+    assert len(values) <= 100
+    assert 123 in x and 789 in x
+    assert values.max() == 50 and values.min() == -50
+
+
+def test_downsample_partly_nan_column():
+    y = np.arange(1000, dtype=float)
+    y[:400] = np.nan
+    x, values = downsample(np.arange(1000), y, 100)
+
+    assert len(x) == len(values) <= 100
+    assert np.isnan(values[x < 400]).all()
+    assert values[x >= 400].min() == 400 and values[x >= 400].max() == 999
+    assert np.all(np.diff(x) > 0)
+
+
+def test_downsample_all_nan():
+    x, values = downsample(np.arange(1000), np.full(1000, np.nan), 100)
+
+    assert len(x) <= 100
+    assert np.isnan(values).all()
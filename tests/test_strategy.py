@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("locust")
+
+from honeypot.core.strategy import SteadyState
+
+
+def make_steady(**options):
+    defaults = {"warmup": "0", "steady_cv": 0.1, "steady_window": 10, "steady_min": 0, "steady_extend": 0,
+                "steady_early": False}
+    defaults.update(options)
+    return SteadyState(SimpleNamespace(**defaults))
+
+
+TOTAL = SimpleNamespace(num_requests=100)
+
+
+def test_steady_min_without_warmup_counts_whole_stage():
+    steady = make_steady(steady_min=30, steady_extend=60)
+    stage = {"duration": 60}
+
+    assert not steady.finished(stage, 59, TOTAL)
+    assert steady.finished(stage, 60, TOTAL)
+
+
+def test_steady_min_extends_until_counted():
+    steady = make_steady(warmup="20", steady_min=60, steady_extend=30)
+    stage = {"duration": 60, "trimmed": 20}
+
+    assert not steady.finished(stage, 60, TOTAL)
+    assert steady.finished(stage, 80, TOTAL)
+
+
+def test_warmup_not_trimmed_extends_to_limit():
+    steady = make_steady(warmup="auto", steady_min=30, steady_extend=60)
+    stage = {"duration": 60}
+
+    assert not steady.finished(stage, 100, TOTAL)
+    assert steady.finished(stage, 120, TOTAL)
+
+
+def test_early_finish_needs_counted_window():
+    steady = make_steady(warmup="auto", steady_early=True)
+    stage = {"duration": 60, "trimmed": 10}
+
+    assert not steady.finished(stage, 10, TOTAL)
+    assert not steady.finished(stage, 20, SimpleNamespace(num_requests=0))
+    assert steady.finished(stage, 20, TOTAL)
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("locust")
+
+from honeypot.core.strategy import DefaultStrategy
+from honeypot.core.variants import Variants
+
+
+def make_variants():
+    options = SimpleNamespace(hosts=None, variant_ratio=None, variant_split="user", hdr_digits=2)
+    environment = SimpleNamespace(parsed_options=options, runner=None, events=MagicMock())
+    return Variants(environment, {"A": "http://a", "B": "http://b"})
+
+
+def test_trim_clears_variant_stats():
+    variants = make_variants()
+    for name in ("A", "B"):
+        variants.local.variant = name
+        variants.on_request(response_time=10)
+        variants.on_request(response_time=20, exception=RuntimeError())
+
+    assert variants.stats["A"]["requests"] == 2
+
+    c_runner = SimpleNamespace(recorder=MagicMock(), variants=variants, generator=MagicMock())
+    DefaultStrategy.reset_stats(SimpleNamespace(env=SimpleNamespace(stats=MagicMock(), c_runner=c_runner)))
+
+    for stats in variants.stats.values():
+        assert stats["requests"] == 0
+        assert stats["failures"] == 0
+    assert variants.snapshots == []